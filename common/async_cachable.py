@@ -0,0 +1,178 @@
+"""asyncio counterpart of `common.cachable` for websocket consumers.
+
+Cached values are read from the local tier and Redis without leaving the event
+loop. Everything which has to be computed goes through the synchronous
+`cached_many` in a worker thread, so locks, stale copies and storages work the
+same way and the cache keys are shared.
+"""
+import asyncio
+import logging
+import time
+import weakref
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+import aioredis
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .cachable import CacheItem, CacheStorage, LocalCache, cached_many, local_cache, _unwrap
+
+logger = logging.getLogger('consumers')
+
+# encoded values larger than that in total are decoded in a worker thread, LZMA would block the event loop
+THREAD_DECODE_SIZE = 64 * 1024
+
+
+async def decode_many(values: List[bytes]) -> List[Any]:
+    def decode() -> List[Any]:
+        return [cache.client.decode(value) for value in values]
+
+    if sum(len(value) for value in values) < THREAD_DECODE_SIZE:
+        return decode()
+    return await asyncio.get_event_loop().run_in_executor(None, decode)
+
+
+class AsyncRedis:
+    """Connection pool to the Redis of the default cache, one per event loop.
+
+    Values are encoded by django_redis, so they are decoded by its client.
+    """
+
+    def __init__(self, address: str, size: int):
+        self.address = address
+        self.size = size
+        self._pools: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    async def pool(self) -> aioredis.Redis:
+        loop = asyncio.get_event_loop()
+        if loop not in self._pools:
+            # a future, so concurrent first calls share one pool
+            self._pools[loop] = asyncio.ensure_future(aioredis.create_redis_pool(self.address, maxsize=self.size))
+        return await self._pools[loop]
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        if not keys:
+            return {}
+        pool = await self.pool()
+        values = await pool.mget(*(cache.make_key(key) for key in keys))
+        found = [(key, value) for key, value in zip(keys, values) if value is not None]
+        return dict(zip((key for key, _ in found), await decode_many([value for _, value in found])))
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        return (await self.get_many([key])).get(key, default)
+
+    async def set(self, key: str, value: Any, timeout: Optional[int] = None) -> None:
+        pool = await self.pool()
+        await pool.set(cache.make_key(key), cache.client.encode(value), expire=timeout or 0)
+
+    async def push(self, key: str, value: Any, timeout: int) -> int:
+        """Appends the value to the list under the key and returns the length of the list."""
+        pool = await self.pool()
+        transaction = pool.multi_exec()
+        length = transaction.rpush(cache.make_key(key), cache.client.encode(value))
+        transaction.expire(cache.make_key(key), timeout)
+        await transaction.execute()
+        return await length
+
+    async def length(self, key: str) -> int:
+        pool = await self.pool()
+        return await pool.llen(cache.make_key(key))
+
+    async def range(self, key: str, start: int) -> List[Any]:
+        """Values of the list under the key from `start` to the end."""
+        pool = await self.pool()
+        return await decode_many(await pool.lrange(cache.make_key(key), start, -1))
+
+
+async_redis = AsyncRedis(settings.CACHES['default']['LOCATION'], settings.POLYGON_ASYNC_POOL_SIZE)
+
+# limit of worker thread tasks, set by a websocket connection for everything it runs
+in_flight: ContextVar[Optional[asyncio.Semaphore]] = ContextVar('in_flight', default=None)
+
+# refreshes of soft-expired values, the loop keeps only weak references to tasks
+_refreshing: Set[asyncio.Future] = set()
+
+
+def _refreshed(task: asyncio.Future) -> None:
+    _refreshing.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error('Background refresh failed', exc_info=task.exception())
+
+
+def limited_sync_to_async(func: Callable) -> Callable:
+    """`database_sync_to_async` which waits for a free slot of `in_flight` before taking a thread."""
+    wrapped = database_sync_to_async(func)
+
+    async def inner(*args, **kwargs) -> Any:
+        semaphore = in_flight.get()
+        if semaphore is None:
+            return await wrapped(*args, **kwargs)
+        async with semaphore:
+            return await wrapped(*args, **kwargs)
+    return inner
+
+
+async def async_cached_many(items: Iterable[CacheItem], compute: Callable[[str, List[Any]], Dict[Any, Any]],
+                            ttl: Optional[int] = None, soft_ttl: Optional[int] = None,
+                            storage: Optional[CacheStorage] = None) -> Dict[CacheItem, Any]:
+    """The same as `cached_many`, but makes no thread hops while every value is cached.
+
+    Missed values are produced by `cached_many` in a worker thread. Soft-expired
+    values are returned as is and refreshed in the background.
+    """
+    keys = {settings.POLYGON_CACHE_KEY.format(func=func, id=pk): (func, pk) for func, pk in items}
+    if local_cache.due():
+        generation = await async_redis.get(LocalCache.GENERATION_KEY, 0)
+        local_cache.update_generation(generation, await async_redis.get_many(local_cache.published_keys(generation)))
+
+    result: Dict[CacheItem, Any] = {}
+    remote = []
+    for key, item in keys.items():
+        value = local_cache.get(key)
+        if value is None:
+            remote.append(key)
+        else:
+            result[item] = value
+    if not remote:
+        return result
+
+    found = await async_redis.get_many(remote)
+    local_cache.count('redis', len(found), len(remote) - len(found))
+    refresh = []
+    now = time.time()
+    for key, stored in found.items():
+        value, refresh_at = _unwrap(stored)
+        result[keys[key]] = value
+        if refresh_at is not None and refresh_at < now:
+            refresh.append(keys[key])
+        else:
+            local_cache.set(key, value, ttl if refresh_at is None else refresh_at - now)
+
+    fetch = limited_sync_to_async(cached_many)
+    if refresh:
+        task = asyncio.ensure_future(fetch(refresh, compute, ttl, soft_ttl, storage))
+        _refreshing.add(task)
+        task.add_done_callback(_refreshed)
+    missed = [keys[key] for key in remote if key not in found]
+    if missed:
+        result.update(await fetch(missed, compute, ttl, soft_ttl, storage))
+    return result
+
+
+def async_cacheable(ttl: Optional[int] = None, soft_ttl: Optional[int] = None,
+                    storage: Optional[CacheStorage] = None):
+    """Async counterpart of `cacheable`, the method becomes a coroutine with the same cache key.
+
+    The decorated method stays synchronous and is called in a worker thread on a miss.
+    """
+    def inner_cacheable(func: Callable) -> Callable:
+        async def cache_wrapper(self) -> Any:
+            item = (func.__name__, self.pk)
+            values = await async_cached_many([item], lambda name, pks: {self.pk: func(self)}, ttl, soft_ttl, storage)
+            return values[item]
+        cache_wrapper.__wrapped__ = func  # type: ignore
+        return cache_wrapper
+
+    return inner_cacheable
@@ -1,20 +1,356 @@
-from typing import Callable, Any
+import threading
+import time
+from collections import OrderedDict, Counter
+from typing import Callable, Any, Dict, Tuple, Optional, Iterable, List, NamedTuple
 
 from django.conf import settings
 from django.core.cache import cache
 
+# the approximate pickle overhead of a value, the local tier is bounded by these estimates
+VALUE_OVERHEAD = 16
 
-def cacheable(ttl=None):
+
+def estimate_size(value: Any) -> int:
+    """Approximate size of the pickled value without pickling it: strings, bytes and containers of them."""
+    if isinstance(value, (str, bytes)):
+        return len(value) + VALUE_OVERHEAD
+    if isinstance(value, dict):
+        return sum(estimate_size(key) + estimate_size(item) for key, item in value.items()) + VALUE_OVERHEAD
+    if isinstance(value, (list, tuple, set)):
+        return sum(estimate_size(item) for item in value) + VALUE_OVERHEAD
+    return VALUE_OVERHEAD
+
+
+class LocalCache:
+    """Bounded in-process LRU in front of the django cache.
+
+    Every `invalidate` increments the shared generation counter and publishes
+    the invalidated keys under `INVALIDATED_KEY` of the new generation. Other
+    processes drop only those keys, and everything when the published keys
+    are lost. The counter is checked at most once per `check_interval` seconds.
+    """
+
+    GENERATION_KEY = 'polygon_generation'
+    INVALIDATED_KEY = 'polygon_invalidated_{generation}'
+    # a process which is that far behind drops everything instead of reading the keys
+    MAX_BEHIND = 1000
+
+    def __init__(self, max_size: int, check_interval: float):
+        self.max_size = max_size
+        self.check_interval = check_interval
+        self.stats: Dict[str, Counter] = {'local': Counter(), 'redis': Counter()}
+        self._items: OrderedDict[str, Tuple[Any, int, Optional[float]]] = OrderedDict()
+        self._size = 0
+        self._generation: Optional[int] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[Optional[List[str]]], None]] = []
+
+    @property
+    def generation(self) -> Optional[int]:
+        return self._generation
+
+    def listen(self, listener: Callable[[Optional[List[str]]], None]) -> None:
+        """`listener` is called with the dropped keys, or None when everything is dropped."""
+        self._listeners.append(listener)
+
+    def due(self) -> bool:
+        """Whether the generation should be checked before the next read."""
+        return time.monotonic() - self._checked >= self.check_interval
+
+    def published_keys(self, generation: int) -> List[str]:
+        """Keys with the invalidated keys of generations after the known one."""
+        if self._generation is None or not 0 < generation - self._generation <= self.MAX_BEHIND:
+            return []
+        return [self.INVALIDATED_KEY.format(generation=number)
+                for number in range(self._generation + 1, generation + 1)]
+
+    def update_generation(self, generation: int, published: Dict[str, List[str]]) -> None:
+        """Drops the keys invalidated since the known generation, `published` are values of `published_keys`."""
+        self._checked = time.monotonic()
+        if generation == self._generation:
+            return
+        expected = self.published_keys(generation)
+        if self._generation is not None:
+            if expected and all(key in published for key in expected):
+                self.drop([cache_key for key in expected for cache_key in published[key]])
+            else:  # the counter was reset or the published keys expired
+                self.clear()
+        self._generation = generation
+
+    def _sync(self) -> None:
+        if self.due():
+            generation = cache.get(self.GENERATION_KEY, 0)
+            expected = self.published_keys(generation)
+            self.update_generation(generation, cache.get_many(expected) if expected else {})
+
+    def get(self, key: str) -> Any:
+        self._sync()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[2] is not None and item[2] < time.monotonic():
+                self._pop(key)
+                item = None
+            if item is None:
+                self.stats['local']['misses'] += 1
+                return None
+            self._items.move_to_end(key)
+            self.stats['local']['hits'] += 1
+            return item[0]
+
+    def count(self, tier: str, hits: int, misses: int) -> None:
+        """Adds hits and misses of a tier read outside of the local cache."""
+        with self._lock:
+            self.stats[tier]['hits'] += hits
+            self.stats[tier]['misses'] += misses
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        size = estimate_size(value)
+        if size > self.max_size:
+            return
+        expires = None if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            self._pop(key)
+            self._items[key] = (value, size, expires)
+            self._size += size
+            while self._size > self.max_size:
+                self._pop(next(iter(self._items)))
+
+    def _pop(self, key: str) -> None:
+        item = self._items.pop(key, None)
+        if item is not None:
+            self._size -= item[1]
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._pop(key)
+
+    def drop(self, keys: List[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._pop(key)
+        for listener in self._listeners:
+            listener(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+        for listener in self._listeners:
+            listener(None)
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'size': self._size, 'items': len(self._items),
+                    **{tier: dict(counter) for tier, counter in self.stats.items()}}
+
+
+local_cache = LocalCache(settings.POLYGON_LOCAL_CACHE_SIZE, settings.POLYGON_LOCAL_CACHE_CHECK)
+
+
+CacheItem = Tuple[str, Any]
+
+
+class CacheStorage:
+    """Durable level behind Redis for values which are expensive to compute."""
+
+    def load(self, items: List[CacheItem]) -> Dict[CacheItem, Any]:
+        raise NotImplementedError
+
+    def save(self, values: Dict[CacheItem, Any]) -> None:
+        raise NotImplementedError
+
+
+class Envelope(NamedTuple):
+    """Stored value with the moment (unix time) after which it should be recomputed."""
+    value: Any
+    refresh_at: Optional[float]
+
+
+LOCK_KEY = 'lock:{key}'
+STALE_KEY = 'stale:{key}'
+# the interval between checks of a value computed by another process doubles up to the maximum
+POLL_INTERVAL = 0.05
+MAX_POLL_INTERVAL = 0.4
+
+
+def _unwrap(stored: Any) -> Tuple[Any, Optional[float]]:
+    # values written by older code or imported by `cache` command are stored as is
+    if isinstance(stored, Envelope):
+        return stored.value, stored.refresh_at
+    return stored, None
+
+
+def _store(values: Dict[str, Any], ttl: Optional[int], soft_ttl: Optional[int]) -> None:
+    refresh_at = None if soft_ttl is None else time.time() + soft_ttl
+    cache.set_many({key: Envelope(value, refresh_at) for key, value in values.items()}, timeout=ttl)
+    for key, value in values.items():
+        local_cache.set(key, value, soft_ttl or ttl)
+
+
+def _fetch(keys: Dict[str, CacheItem], compute: Callable[[List[str]], Dict[str, Any]],
+           ttl: Optional[int], soft_ttl: Optional[int], storage: Optional[CacheStorage] = None) -> Dict[str, Any]:
+    """Two-tier read with single-flight computation of missed and soft-expired keys.
+
+    Only the process which owns the lock of a key computes it. Others take the
+    stale copy left by `invalidate` or wait for the owner, and compute the value
+    themselves only when the lock expires without a value (the owner has gone).
+    Soft-expired values are served as is while the lock owner refreshes them.
+    Missed values are looked up in `storage` before computing.
+    """
+    def produce(missing: List[str], refreshing: List[str]) -> Dict[str, Any]:
+        values: Dict[str, Any] = {}
+        if storage is not None and missing:
+            loaded = storage.load([keys[key] for key in missing])
+            values = {key: loaded[keys[key]] for key in missing if keys[key] in loaded}
+        rest = [key for key in missing + refreshing if key not in values]
+        if rest:
+            computed = compute(rest)
+            if storage is not None:
+                storage.save({keys[key]: value for key, value in computed.items()})
+            values.update(computed)
+        _store(values, ttl, soft_ttl)
+        return values
+
+    result: Dict[str, Any] = {}
+    remote = []
+    for key in keys:
+        value = local_cache.get(key)
+        if value is None:
+            remote.append(key)
+        else:
+            result[key] = value
+    if not remote:
+        return result
+
+    found = cache.get_many(remote)
+    local_cache.count('redis', len(found), len(remote) - len(found))
+    refresh = []
+    now = time.time()
+    for key, stored in found.items():
+        value, refresh_at = _unwrap(stored)
+        result[key] = value
+        if refresh_at is not None and refresh_at < now:
+            refresh.append(key)
+        else:
+            local_cache.set(key, value, ttl if refresh_at is None else refresh_at - now)
+    missed = [key for key in remote if key not in found]
+
+    owned = [key for key in missed + refresh
+             if cache.add(LOCK_KEY.format(key=key), 1, timeout=settings.POLYGON_LOCK_TIMEOUT)]
+    if owned:
+        try:
+            result.update(produce([key for key in owned if key not in found], [key for key in owned if key in found]))
+        finally:
+            cache.delete_many([LOCK_KEY.format(key=key) for key in owned])
+
+    waiting = [key for key in missed if key not in result]
+    if waiting:
+        stale = cache.get_many([STALE_KEY.format(key=key) for key in waiting])
+        for key in waiting:
+            if STALE_KEY.format(key=key) in stale:
+                result[key] = _unwrap(stale[STALE_KEY.format(key=key)])[0]
+        waiting = [key for key in waiting if key not in result]
+
+    deadline = time.monotonic() + settings.POLYGON_LOCK_TIMEOUT
+    interval = POLL_INTERVAL
+    while waiting and time.monotonic() < deadline:
+        time.sleep(min(interval, max(deadline - time.monotonic(), 0)))
+        interval = min(interval * 2, MAX_POLL_INTERVAL)
+        for key, stored in cache.get_many(waiting).items():
+            result[key] = _unwrap(stored)[0]
+        waiting = [key for key in waiting if key not in result]
+        if waiting:  # a lock without a value has expired: its owner has gone, one of the waiters takes it over
+            locks = cache.get_many([LOCK_KEY.format(key=key) for key in waiting])
+            taken = [key for key in waiting if LOCK_KEY.format(key=key) not in locks and
+                     cache.add(LOCK_KEY.format(key=key), 1, timeout=settings.POLYGON_LOCK_TIMEOUT)]
+            if taken:
+                try:
+                    result.update(produce(taken, []))
+                finally:
+                    cache.delete_many([LOCK_KEY.format(key=key) for key in taken])
+                waiting = [key for key in waiting if key not in result]
+
+    if waiting:  # the lock outlived POLYGON_LOCK_TIMEOUT, e.g. Redis was flushed
+        result.update(produce(waiting, []))
+    return result
+
+
+def invalidate(cache_key: str) -> None:
+    """Removes the value from Redis and from the local tier of every process.
+
+    The old value is kept for POLYGON_STALE_TTL seconds to be served while the
+    new one is computed.
+    """
+    invalidate_many([cache_key])
+
+
+def invalidate_many(cache_keys: Iterable[str], keep_stale: bool = True) -> None:
+    """`invalidate` for many keys in a few round trips, without stale copies for cheap values."""
+    cache_keys = list(cache_keys)
+    if keep_stale:
+        # the value becomes the stale copy in Redis without being read and written back
+        pipeline = cache.client.get_client(write=True).pipeline(transaction=False)
+        for key in cache_keys:
+            stale = cache.make_key(STALE_KEY.format(key=key))
+            pipeline.rename(cache.make_key(key), stale)
+            pipeline.expire(stale, settings.POLYGON_STALE_TTL)
+        pipeline.execute(raise_on_error=False)  # absent keys aren't renamed
+    else:
+        cache.delete_many(cache_keys)
+    local_cache.drop(cache_keys)
+    try:
+        generation = cache.incr(LocalCache.GENERATION_KEY)
+    except ValueError:
+        generation = 1
+        cache.set(LocalCache.GENERATION_KEY, generation, timeout=None)
+    # other processes drop only these keys, see `LocalCache.update_generation`
+    cache.set(LocalCache.INVALIDATED_KEY.format(generation=generation), cache_keys,
+              timeout=settings.POLYGON_INVALIDATED_TTL)
+
+
+def cached_many(items: Iterable[CacheItem], compute: Callable[[str, List[Any]], Dict[Any, Any]],
+                ttl: Optional[int] = None, soft_ttl: Optional[int] = None,
+                storage: Optional[CacheStorage] = None) -> Dict[CacheItem, Any]:
+    """Bulk counterpart of `cacheable` for (function name, pk) pairs.
+
+    Everything absent in the local tier is read with one `get_many`, `compute`
+    is called once per function name with the missed pks and the results are
+    written back with one `set_many`.
+    """
+    keys = {settings.POLYGON_CACHE_KEY.format(func=func, id=pk): (func, pk) for func, pk in items}
+
+    def compute_keys(missed: List[str]) -> Dict[str, Any]:
+        grouped: Dict[str, List[Any]] = {}
+        for key in missed:
+            func, pk = keys[key]
+            grouped.setdefault(func, []).append(pk)
+        return {settings.POLYGON_CACHE_KEY.format(func=func, id=pk): value
+                for func, pks in grouped.items() for pk, value in compute(func, pks).items()}
+
+    return {keys[key]: value for key, value in _fetch(keys, compute_keys, ttl, soft_ttl, storage).items()}
+
+
+def cached_value(key: str, compute: Callable[[], Any], ttl: Optional[int] = None) -> Any:
+    """A value under an arbitrary cache key with the same tiers and locks as `cacheable`."""
+    return _fetch({key: ('value', key)}, lambda _: {key: compute()}, ttl, None)[key]
+
+
+def cacheable(ttl: Optional[int] = None, soft_ttl: Optional[int] = None, storage: Optional[CacheStorage] = None):
+    """Caches the property in the local tier and Redis by its name and pk of the instance.
+
+    With `soft_ttl` the value is recomputed by one caller after `soft_ttl`
+    seconds while the others keep getting the current value. `storage` is a
+    durable level consulted before the value is computed.
+    """
     def inner_cacheable(func: Callable) -> Callable:
         def cache_wrapper(*args, **kwargs) -> Any:
             self = args[0]
             pk = self if isinstance(self, str) else self.pk
             cache_key = settings.POLYGON_CACHE_KEY.format(func=func.__name__, id=pk)
-            result = cache.get(cache_key)
-            if result is None:
-                result = func(*args, **kwargs)
-                cache.set(cache_key, result, timeout=ttl)
-            return result
+            return _fetch({cache_key: (func.__name__, pk)}, lambda _: {cache_key: func(*args, **kwargs)},
+                          ttl, soft_ttl, storage)[cache_key]
+        cache_wrapper.__wrapped__ = func  # type: ignore
         return cache_wrapper
 
     return inner_cacheable
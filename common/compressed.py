@@ -0,0 +1,65 @@
+"""Pre-compressed representations of heavy payloads.
+
+A payload is cached together with its gzip and brotli encodings, so a hit is
+served without compressing the same bytes again by the application or nginx
+(which doesn't compress responses with Content-Encoding).
+"""
+import gzip
+from typing import Callable, Dict, Optional
+
+import brotli
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .cachable import cached_value
+
+IDENTITY = 'identity'
+# in the order of preference
+ENCODERS: Dict[str, Callable[[bytes], bytes]] = {
+    'br': lambda data: brotli.compress(data, quality=settings.PAYLOAD_BROTLI_QUALITY),
+    'gzip': lambda data: gzip.compress(data, compresslevel=settings.PAYLOAD_GZIP_LEVEL),
+}
+
+Payloads = Dict[str, bytes]
+
+
+def compress_payload(data: bytes) -> Payloads:
+    """The payload by encoding, small ones are kept as is only."""
+    result = {IDENTITY: data}
+    if len(data) >= settings.PAYLOAD_MIN_COMPRESS:
+        result.update({encoding: encode(data) for encoding, encode in ENCODERS.items()})
+    return result
+
+
+def cached_payload(key: str, build: Callable[[], bytes], ttl: Optional[int] = None) -> Payloads:
+    """`build` is called on a miss only, the result is stored with its encodings under the key."""
+    return cached_value(key, lambda: compress_payload(build()), ttl)
+
+
+def accepted_encoding(accept: str, payloads: Payloads) -> str:
+    """The most preferred of the stored encodings which the client accepts, qvalues only exclude with q=0."""
+    accepted = set()
+    for part in accept.split(','):
+        encoding, _, params = part.partition(';')
+        params = params.replace(' ', '')
+        try:
+            quality = float(params[2:]) if params.startswith('q=') else 1.0
+        except ValueError:
+            quality = 1.0
+        if quality > 0:
+            accepted.add(encoding.strip().lower())
+    for encoding in ENCODERS:
+        if encoding in payloads and (encoding in accepted or '*' in accepted):
+            return encoding
+    return IDENTITY
+
+
+class CompressedResponse(HttpResponse):
+    def __init__(self, request: HttpRequest, payloads: Payloads, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        encoding = accepted_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), payloads)
+        super().__init__(content=payloads[encoding], **kwargs)
+        patch_vary_headers(self, ('Accept-Encoding',))
+        if encoding != IDENTITY:
+            self['Content-Encoding'] = encoding
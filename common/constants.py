@@ -16,3 +16,8 @@ class Point(TypedDict):
 class GameQuestions(TypedDict):
     questions: List[Dict]
     solved: List[Dict]
+
+
+class TopologyGameQuestions(GameQuestions):
+    game: int
+    arcs: List[str]
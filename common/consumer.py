@@ -1,7 +1,22 @@
-import inspect
-from typing import Callable
+import asyncio
+import logging
+from collections import deque
+from typing import Callable, Deque, Dict, Tuple, List, Optional, Union
 
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
+
+from .async_cachable import in_flight
+from .metrics import metrics, timed_action, section, current_action
+
+logger = logging.getLogger('consumers')
+
+Frame = Union[Dict, List[Dict]]
+
+# the reply to an action which is dropped because the queue of the connection is full
+OVERLOADED = 'OVERLOADED'
+# the reply to an action with missing or malformed fields
+INVALID = 'INVALID'
 
 
 def action(action_type) -> Callable:
@@ -11,16 +26,37 @@ def action(action_type) -> Callable:
     return wrap
 
 
+def collect_actions(cls: type) -> Dict[str, Tuple[str, ...]]:
+    """Names of `@action` methods of the class by action type, in the order of names."""
+    result: Dict[str, Tuple[str, ...]] = {}
+    for name in sorted(dir(cls)):
+        method = getattr(cls, name, None)
+        if callable(method) and hasattr(method, 'action_type'):
+            result[method.action_type] = result.get(method.action_type, ()) + (name,)
+    return result
+
+
 class ReduxConsumer(AsyncJsonWebsocketConsumer):
     http_user = True
 
+    _actions: Dict[str, Tuple[str, ...]] = {}
+    # action types which send their messages themselves (e.g. by chunks), they aren't folded into batch replies
+    UNBATCHED: Tuple[str, ...] = ()
+    _replies: Optional[List[Dict]] = None  # messages of the frame which is being processed
+    # frames waiting for the worker, frames are processed one by one in the order of receiving
+    _pending: Optional[Deque[Frame]] = None
+    _wakeup: Optional[asyncio.Event] = None
+    _worker: Optional[asyncio.Future] = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._actions = collect_actions(cls)
+
     async def _list_actions(self):
-        methods = inspect.getmembers(self, predicate=inspect.ismethod)
-        return [m[1] for m in methods if hasattr(m[1], 'action_type')]
+        return [getattr(self, name) for name in sorted(name for names in self._actions.values() for name in names)]
 
     async def _get_actions(self, action_type):
-        methods = inspect.getmembers(self, predicate=inspect.ismethod)
-        return [m[1] for m in methods if hasattr(m[1], 'action_type') and m[1].action_type == action_type]
+        return [getattr(self, name) for name in self._actions.get(action_type, ())]
 
     async def get_control_channel(self, user=None):
         if 'user' not in self.message.channel_session:
@@ -40,10 +76,139 @@ class ReduxConsumer(AsyncJsonWebsocketConsumer):
             groups.append(control)
         return groups
 
-    async def receive_json(self, content, multiplexer=None, **kwargs):  # pylint: disable=arguments-differ
+    async def prefetch(self, actions: List[Dict]) -> None:
+        """Called once before actions of one frame to load what they share."""
+
+    async def send_json(self, content, close=False):
+        if self._replies is not None and not close:
+            self._replies.extend(content if isinstance(content, list) else [content])
+            return
+        with section('serialize'):
+            text = await self.encode_json(content)
+        metrics.observe('ws.payload', len(text), action=current_action())
+        with section('send'):
+            await self.send(text_data=text, close=close)
+
+    async def websocket_connect(self, message):
+        metrics.add('ws.connections', 1, consumer=type(self).__name__)
+        self._pending, self._wakeup = deque(), asyncio.Event()
+        self._worker = asyncio.ensure_future(self._work())
+        await super().websocket_connect(message)
+
+    async def websocket_disconnect(self, message):
+        metrics.add('ws.connections', -1, consumer=type(self).__name__)
+        if self._worker is not None:
+            self._worker.cancel()
+        await super().websocket_disconnect(message)
+
+    async def receive(self, text_data=None, bytes_data=None, **kwargs):
+        """Puts the frame to the queue of the connection, so frames of a flooding client are dropped or merged
+        instead of waiting in the unbounded queue of the server."""
+        if self._pending is None:  # the connection isn't set up by websocket_connect
+            await super().receive(text_data, bytes_data, **kwargs)
+            return
+        if not text_data:
+            raise ValueError('No text section for incoming WebSocket frame!')
+        dropped = self.enqueue(self.limit(await self.decode_json(text_data)))
+        if dropped:
+            # sent right away, not with the replies of the batch which is being processed
+            replies = [{'type': OVERLOADED, 'action': item} for item in dropped]
+            await self.send(text_data=await self.encode_json(replies))
+
+    def limit(self, content: Frame) -> Frame:
+        """Cuts batches to WS_MAX_BATCH actions and `ids` of actions to WS_MAX_IDS."""
+        if isinstance(content, list):
+            if len(content) > settings.WS_MAX_BATCH:
+                metrics.add('ws.truncated', len(content) - settings.WS_MAX_BATCH, action='BATCH')
+            return [self.limit(item) for item in content[:settings.WS_MAX_BATCH]]
+        ids = content.get('ids')
+        if isinstance(ids, list) and len(ids) > settings.WS_MAX_IDS:
+            metrics.add('ws.truncated', len(ids) - settings.WS_MAX_IDS, action=self.metric_action(content))
+            content['ids'] = ids[:settings.WS_MAX_IDS]
+        return content
+
+    def metric_action(self, content: Dict) -> str:
+        """The action tag of metrics, types which the client made up are counted together."""
+        action_type = str(content.get('type')).upper()
+        return action_type if action_type in self._actions else 'unknown'
+
+    def merge_action(self, queued: Dict, content: Dict) -> bool:
+        """Folds the action into the queued one if it's possible. Repeated actions are merged by default."""
+        return queued == content
+
+    def enqueue(self, content: Frame) -> List[Dict]:
+        """Adds the frame to the queue, when it's full the frame is dropped or merged according to WS_QUEUE_POLICY.
+
+        Actions which can't be merged into queued ones are dropped and returned, the client gets an OVERLOADED
+        message for each of them.
+        """
+        if len(self._pending) < settings.WS_QUEUE_SIZE:
+            self._pending.append(content)
+            self._wakeup.set()
+            return []
+        dropped = []
+        queued = [action for frame in self._pending for action in (frame if isinstance(frame, list) else [frame])]
+        for item in content if isinstance(content, list) else [content]:
+            action_type = self.metric_action(item)
+            if settings.WS_QUEUE_POLICY == 'merge' and any(self.merge_action(action, item) for action in queued):
+                metrics.add('ws.merged', 1, action=action_type)
+            else:
+                metrics.add('ws.dropped', 1, action=action_type)
+                dropped.append(item)
+        return dropped
+
+    async def _work(self) -> None:
+        # the semaphore belongs to the context of the worker and tasks it starts
+        in_flight.set(asyncio.Semaphore(settings.WS_IN_FLIGHT))
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            try:
+                await self.receive_json(self._pending.popleft())
+            except Exception:  # pylint: disable=broad-except
+                logger.exception('Websocket frame failed, closing the connection')
+                await self.close(code=1011)
+                return
+
+    async def flush_replies(self) -> None:
+        """Sends the replies collected so far, the next messages are sent as they come."""
+        replies, self._replies = self._replies, None
+        if replies:
+            await self.send_json(replies)
+
+    async def receive_batch(self, actions: List[Dict], multiplexer=None) -> None:
+        """Runs actions of one frame, their messages are sent back as an array in one frame.
+
+        Messages of UNBATCHED actions are sent as they come, after the replies collected before them."""
+        with timed_action('BATCH'):
+            self._replies = []
+            try:
+                await self.prefetch(actions)
+                for content in actions:
+                    if str(content.get('type')).upper() in self.UNBATCHED:
+                        await self.flush_replies()
+                        await self.dispatch_action(content, multiplexer=multiplexer)
+                        self._replies = []
+                    else:
+                        await self.dispatch_action(content, multiplexer=multiplexer)
+            finally:
+                replies, self._replies = self._replies, None
+            if replies:
+                await self.send_json(replies)
+
+    async def dispatch_action(self, content: Dict, multiplexer=None) -> None:
         action_type = content['type'].upper()
-        methods = await self._get_actions(action_type)
-        if not methods:
+        names = self._actions.get(action_type)
+        if not names:
             raise NotImplementedError('{} not implemented'.format(action_type))
-        for method in methods:
-            await method(content, multiplexer=multiplexer)
+        with timed_action(action_type):
+            for name in names:
+                await getattr(self, name)(content, multiplexer=multiplexer)
+
+    async def receive_json(self, content, multiplexer=None, **kwargs):  # pylint: disable=arguments-differ
+        if isinstance(content, list):
+            await self.receive_batch(content, multiplexer=multiplexer)
+        else:
+            await self.dispatch_action(content, multiplexer=multiplexer)
@@ -0,0 +1,133 @@
+import asyncio
+import random
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from copy import deepcopy
+from typing import Callable, Dict, Iterator, List
+
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.gis.geos import MultiPolygon, Polygon
+from django.core.management import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from maps.models import Region, RegionTranslation
+from mercator.routing import application
+
+# far from real osm ids
+OSM_ID_BASE = 2000000000
+GRID = 20
+
+
+@contextmanager
+def throwaway_environment() -> Iterator[None]:
+    """Test database and own cache keys, so benchmarks neither touch real data nor invalidate real caches."""
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    caches = deepcopy(settings.CACHES)
+    caches['default']['KEY_PREFIX'] = 'bench'
+    try:
+        with override_settings(CACHES=caches):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def square(index: int) -> MultiPolygon:
+    lng, lat = -170.0 + (index % GRID) * 2.0, -60.0 + (index // GRID) * 2.0
+    return MultiPolygon(Polygon(((lng, lat), (lng + 1, lat), (lng + 1, lat + 1), (lng, lat + 1), (lng, lat))))
+
+
+class Player:
+    def __init__(self, path: str, regions: List[Region], latencies: Dict[str, List[float]]):
+        self.communicator = WebsocketCommunicator(application, path, headers=[(b'accept-language', b'en')])
+        self.regions = regions
+        self.latencies = latencies
+
+    async def timed(self, name: str, payload: Dict, replies: int = 1) -> None:
+        start = time.perf_counter()
+        await self.communicator.send_json_to(payload)
+        for _ in range(replies):
+            await self.communicator.receive_json_from(timeout=30)
+        self.latencies[name].append(time.perf_counter() - start)
+
+    async def connect(self) -> None:
+        start = time.perf_counter()
+        connected, _ = await self.communicator.connect(timeout=30)
+        if not connected:
+            raise RuntimeError('Connection rejected')
+        self.latencies['connect'].append(time.perf_counter() - start)
+
+
+class PuzzlePlayer(Player):
+    async def check(self, region: Region) -> None:
+        bounds = region.polygon.extent
+        coords = {'west': bounds[0], 'south': bounds[1], 'east': bounds[2], 'north': bounds[3]}
+        await self.timed('PUZZLE_CHECK', {'type': 'PUZZLE_CHECK', 'id': region.pk, 'coords': coords, 'zoom': 5})
+
+    async def give_up(self) -> None:
+        chunks = -(-len(self.regions) // settings.GIVEUP_CHUNK_SIZE)
+        await self.timed('PUZZLE_GIVEUP', {'type': 'PUZZLE_GIVEUP', 'ids': [region.pk for region in self.regions]},
+                         replies=chunks)
+
+
+class QuizPlayer(Player):
+    async def check(self, region: Region) -> None:
+        center = region.polygon.centroid
+        coords = {'lat': center.y, 'lng': center.x}
+        await self.timed('QUIZ_CHECK', {'type': 'QUIZ_CHECK', 'id': region.pk, 'coords': coords})
+
+    async def give_up(self) -> None:
+        await self.timed('QUIZ_GIVEUP', {'type': 'QUIZ_GIVEUP', 'id': random.choice(self.regions).pk})
+
+
+class Command(BaseCommand):
+    help = 'Drives simulated players through puzzle and quiz consumers and reports latency per action'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', action='store', type=int, default=50, help='Concurrent players per game')
+        parser.add_argument('--checks', action='store', type=int, default=20, help='Checks per player')
+        parser.add_argument('--regions', action='store', type=int, default=100, help='Synthetic regions')
+
+    def create_regions(self, count: int) -> List[Region]:
+        regions = []
+        for index in range(count):
+            region = Region.objects.create(title=f'bench {index}', polygon=square(index), osm_id=OSM_ID_BASE + index)
+            RegionTranslation.objects.create(master=region, language_code='en', name=f'bench {index}')
+            regions.append(Region.objects.defer(None).get(pk=region.pk))
+        return regions
+
+    async def play(self, player: Player, checks: int) -> None:
+        await player.connect()
+        for _ in range(checks):
+            await player.check(random.choice(player.regions))
+        await player.give_up()
+        await player.communicator.disconnect()
+
+    def report(self, latencies: Dict[str, List[float]], elapsed: float) -> None:
+        total = sum(len(values) for values in latencies.values())
+        self.stdout.write(f'{total} actions in {elapsed:.2f}s, {total / elapsed:.1f} actions/s')
+        for name, values in sorted(latencies.items()):
+            values = sorted(values)
+            percentiles = ' '.join(f'p{p}={values[min(len(values) - 1, len(values) * p // 100)] * 1000:.1f}ms'
+                                   for p in (50, 95, 99))
+            self.stdout.write(f'{name:>14}: {len(values):>6} {len(values) / elapsed:>8.1f}/s {percentiles}')
+
+    def handle(self, *args, **options):
+        layers = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+        with throwaway_environment(), override_settings(CHANNEL_LAYERS=layers):
+            regions = self.create_regions(options['regions'])
+            for game, player_class in (('puzzle', PuzzlePlayer), ('quiz', QuizPlayer)):
+                latencies: Dict[str, List[float]] = defaultdict(list)
+                start = time.perf_counter()
+                asyncio.run(self._gather(lambda: player_class(f'/ws/{game}/', regions, latencies),
+                                         options['players'], options['checks']))
+                self.report(latencies, time.perf_counter() - start)
+
+    async def _gather(self, player_factory: Callable[[], Player], players: int, checks: int) -> None:
+        # communicators start the application, so they are created on the running loop
+        await asyncio.gather(*(self.play(player_factory(), checks) for _ in range(players)))
@@ -0,0 +1,45 @@
+import asyncio
+import inspect
+import time
+
+from django.core.management import BaseCommand
+
+from common.consumer import action
+from puzzle.consumer import PuzzleConsumer
+
+
+class BenchConsumer(PuzzleConsumer):
+    @action('BENCH_NOOP')
+    async def bench_noop(self, message, **kwargs):
+        pass
+
+
+async def legacy_receive_json(consumer, content, multiplexer=None):
+    # dispatch as it was done before the action table: inspect every bound method on each frame
+    action_type = content['type'].upper()
+    methods = inspect.getmembers(consumer, predicate=inspect.ismethod)
+    for method in [m[1] for m in methods if hasattr(m[1], 'action_type') and m[1].action_type == action_type]:
+        await method(content, multiplexer=multiplexer)
+
+
+class Command(BaseCommand):
+    help = 'Measures the cost of dispatching one websocket message to its @action handler'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', action='store', type=int, default=100000, help='Messages per run')
+
+    def handle(self, *args, **options):
+        consumer = BenchConsumer.__new__(BenchConsumer)  # dispatch doesn't need a connection
+        content = {'type': 'bench_noop'}
+        count = options['messages']
+
+        async def run(receive) -> float:
+            start = time.perf_counter()
+            for _ in range(count):
+                await receive(content)
+            return (time.perf_counter() - start) / count * 1e6
+
+        legacy = asyncio.run(run(lambda message: legacy_receive_json(consumer, message)))
+        table = asyncio.run(run(consumer.receive_json))
+        self.stdout.write(f'getmembers: {legacy:.2f} us/message')
+        self.stdout.write(f'action table: {table:.2f} us/message ({legacy / table:.1f}x)')
@@ -0,0 +1,68 @@
+import time
+from typing import Callable, Dict, List
+
+from django.contrib.gis.geos import Point
+from django.core.management import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from common.constants import GameQuestions
+from common.utils import get_language
+from maps.models import Region, RegionTranslation
+from quiz.forms import QuizInfoboxForm
+from quiz.models import Quiz, QuizRegion
+from .bench_consumers import OSM_ID_BASE, square, throwaway_environment
+
+SLUG = 'bench-quiz'
+
+
+def legacy_json(form: QuizInfoboxForm) -> GameQuestions:
+    # questions as they were built before the bulk read: a translation query (or insert) per region
+    should_be_solved = [x.region_id for x in form.game.quizregion_set.all() if x.is_solved]
+    questions: List[Dict] = []
+    solved = []
+    for region in form.regions:
+        trans = region.translation
+        if trans.infobox is None or region.pk in should_be_solved:
+            solved.append(region.pk)
+            continue
+        k = {param: trans.infobox[param] for param in form.cleaned_data['params'] if param in trans.infobox}
+        if k:
+            questions.append({**k, 'id': region.pk, 'name': trans.infobox.get('name')})
+        else:
+            solved.append(region.pk)
+    return GameQuestions(questions=questions, solved=Region.bulk_full_info(solved, get_language(), form.game.zoom))
+
+
+class Command(BaseCommand):
+    help = 'Compares building quiz questions with a translation query per region and with the bulk read'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--regions', action='store', type=int, default=200, help='Regions of the quiz')
+        parser.add_argument('--runs', action='store', type=int, default=20, help='Runs of each builder')
+
+    def create_quiz(self, count: int) -> Quiz:
+        quiz = Quiz.objects.create(slug=SLUG, center=Point(0, 0))
+        for index in range(count):
+            region = Region.objects.create(title=f'bench {index}', polygon=square(index), osm_id=OSM_ID_BASE + index)
+            RegionTranslation.objects.create(master=region, language_code='en', name=f'bench {index}',
+                                             infobox={'name': f'bench {index}', 'capital': f'capital {index}'})
+            QuizRegion.objects.create(quiz=quiz, region=region, is_solved=index % 10 == 0)
+        return quiz
+
+    def measure(self, name: str, build: Callable[[QuizInfoboxForm], GameQuestions], quiz: Quiz, runs: int) -> None:
+        form = QuizInfoboxForm(game=quiz, data={'params': 'name,capital'})
+        form.is_valid()
+        build(form)  # fills caches of solved regions
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            for _ in range(runs):
+                build(form)
+            elapsed = (time.perf_counter() - start) / runs
+        self.stdout.write(f'{name:>7}: {elapsed * 1000:.1f}ms, {len(context.captured_queries) / runs:.0f} queries')
+
+    def handle(self, *args, **options):
+        with throwaway_environment():
+            quiz = self.create_quiz(options['regions'])
+            self.measure('legacy', legacy_json, quiz, options['runs'])
+            self.measure('bulk', QuizInfoboxForm.json, quiz, options['runs'])
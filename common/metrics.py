@@ -0,0 +1,149 @@
+"""Timings, sizes and counters of websocket consumers.
+
+Measurements go to the sink configured by METRICS_SINK. An action is timed by
+`timed_action`, parts of it (cache, form, serialization...) by `section`,
+which adds the time to the action which is being processed in the current
+context.
+"""
+import json
+import logging
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger('metrics')
+
+MetricKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class MetricsSink:
+    def observe(self, name: str, value: float, **tags: str) -> None:
+        """Adds a value to the histogram."""
+        raise NotImplementedError
+
+    def add(self, name: str, delta: float, **tags: str) -> None:
+        """Changes the counter."""
+        raise NotImplementedError
+
+    def info(self) -> Dict[str, Any]:
+        return {}
+
+
+class MemorySink(MetricsSink):
+    """Keeps histograms with power of 2 buckets and counters in the process."""
+
+    def __init__(self):
+        self._histograms: Dict[MetricKey, Counter] = defaultdict(Counter)
+        self._totals: Dict[MetricKey, list] = defaultdict(lambda: [0, 0.0, 0.0])  # count, sum, max
+        self._counters: Dict[MetricKey, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, tags: Dict[str, str]) -> MetricKey:
+        return name, tuple(sorted(tags.items()))
+
+    def observe(self, name: str, value: float, **tags: str) -> None:
+        key = self._key(name, tags)
+        bucket = math.ceil(math.log2(value)) if value > 0 else None
+        with self._lock:
+            self._histograms[key][bucket] += 1
+            totals = self._totals[key]
+            totals[0] += 1
+            totals[1] += value
+            totals[2] = max(totals[2], value)
+
+    def add(self, name: str, delta: float, **tags: str) -> None:
+        with self._lock:
+            self._counters[self._key(name, tags)] += delta
+
+    @staticmethod
+    def _percentile(buckets: Counter, count: int, percent: int) -> float:
+        # upper bound of the bucket which contains the percentile
+        position = count * percent / 100
+        passed = 0
+        for bucket in sorted(buckets, key=lambda item: -math.inf if item is None else item):
+            passed += buckets[bucket]
+            if passed >= position:
+                return 0.0 if bucket is None else 2.0 ** bucket
+        return 0.0
+
+    def info(self) -> Dict[str, Any]:
+        def label(key: MetricKey) -> str:
+            name, tags = key
+            return name + ''.join(f',{tag}={value}' for tag, value in tags)
+
+        with self._lock:
+            histograms = {label(key): {'count': totals[0], 'sum': totals[1], 'max': totals[2],
+                                       **{f'p{percent}': self._percentile(self._histograms[key], totals[0], percent)
+                                          for percent in (50, 95, 99)}}
+                          for key, totals in self._totals.items()}
+            counters = {label(key): value for key, value in self._counters.items()}
+        return {'histograms': histograms, 'counters': counters}
+
+
+class LoggingSink(MemorySink):
+    """MemorySink which writes the summary to the `metrics` logger every METRICS_LOG_INTERVAL seconds."""
+
+    def __init__(self):
+        super().__init__()
+        self._logged = time.monotonic()
+
+    def _flush(self) -> None:
+        now = time.monotonic()
+        if now - self._logged >= settings.METRICS_LOG_INTERVAL:
+            self._logged = now
+            logger.info(json.dumps(self.info()))
+
+    def observe(self, name: str, value: float, **tags: str) -> None:
+        super().observe(name, value, **tags)
+        self._flush()
+
+    def add(self, name: str, delta: float, **tags: str) -> None:
+        super().add(name, delta, **tags)
+        self._flush()
+
+
+metrics: MetricsSink = import_string(settings.METRICS_SINK)()
+
+_sections: ContextVar[Optional[Dict[str, float]]] = ContextVar('metrics_sections', default=None)
+_action: ContextVar[str] = ContextVar('metrics_action', default='')
+
+
+def current_action() -> str:
+    return _action.get()
+
+
+@contextmanager
+def timed_action(name: str) -> Iterator[None]:
+    """Observes `ws.action` and `ws.section` of each section of the action."""
+    sections: Dict[str, float] = {}
+    sections_token = _sections.set(sections)
+    action_token = _action.set(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _sections.reset(sections_token)
+        _action.reset(action_token)
+        metrics.observe('ws.action', elapsed, action=name)
+        for section_name, seconds in sections.items():
+            metrics.observe('ws.section', seconds, action=name, section=section_name)
+
+
+@contextmanager
+def section(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        sections = _sections.get()
+        if sections is not None:
+            sections[name] = sections.get(name, 0.0) + time.perf_counter() - start
@@ -1,5 +1,18 @@
-from typing import List
+import asyncio
+import gzip
+import json
+import threading
+import time
+from collections import deque
+from typing import List, Optional
 
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from .cachable import LocalCache, STALE_KEY, estimate_size, invalidate, invalidate_many, cacheable
+from .compressed import IDENTITY, accepted_encoding, compress_payload
+from .consumer import ReduxConsumer, action
+from .metrics import MemorySink, metrics
 from .utils import random_string
 
 
@@ -57,3 +70,222 @@ class TestGameMixin:
             shuffled_retries -= 1  # pragma: no cover
         else:
             self.failureException('Question random is broken')
+
+
+class LocalCacheTestCase(SimpleTestCase):
+    def test_lru(self):
+        local = LocalCache(max_size=150, check_interval=0)
+        local.set('first', 'a' * 40)
+        local.set('second', 'b' * 40)
+        self.assertIsNotNone(local.get('first'))
+        local.set('third', 'c' * 40)  # evicts the least recently used
+        self.assertIsNone(local.get('second'))
+        self.assertIsNotNone(local.get('first'))
+        self.assertLessEqual(local.info()['size'], 150)
+        self.assertEqual(local.stats['local']['misses'], 1)
+
+    def test_estimate_size(self):
+        polygon = ['a' * 100, 'b' * 50]
+        self.assertGreaterEqual(estimate_size(polygon), 150)
+        self.assertLess(estimate_size(polygon), 250)
+        self.assertGreater(estimate_size({'polygon': polygon}), estimate_size(polygon))
+        local = LocalCache(max_size=100, check_interval=0)
+        local.set('key', polygon)  # larger than the whole local tier
+        self.assertIsNone(local.get('key'))
+        local.count('redis', 2, 1)
+        self.assertDictEqual(local.info()['redis'], {'hits': 2, 'misses': 1})
+
+    def test_invalidate(self):
+        local = LocalCache(max_size=100, check_interval=0)
+        local.set('key', 'value')
+        local.set('another', 'value')
+        self.assertEqual(local.get('key'), 'value')
+        invalidate('another')  # published for other processes
+        self.assertIsNone(local.get('another'))
+        self.assertEqual(local.get('key'), 'value')
+
+        cache.delete(LocalCache.INVALIDATED_KEY.format(generation=cache.incr(LocalCache.GENERATION_KEY)))
+        self.assertIsNone(local.get('key'))  # the keys are lost, everything is dropped
+
+    def test_invalidate_many(self):
+        kept, dropped = random_string(), random_string()
+        cache.set_many({kept: 'value', dropped: 'value'})
+        invalidate_many([kept])
+        invalidate_many([dropped], keep_stale=False)
+        self.assertIsNone(cache.get(kept))
+        self.assertIsNone(cache.get(dropped))
+        self.assertEqual(cache.get(STALE_KEY.format(key=kept)), 'value')
+        self.assertIsNone(cache.get(STALE_KEY.format(key=dropped)))
+
+
+class SlowRegion:
+    def __init__(self):
+        self.pk = random_string()
+        self.calls = 0
+
+    @property  # type: ignore
+    @cacheable(ttl=60)
+    def polygon_slow(self) -> int:
+        self.calls += 1
+        time.sleep(0.2)
+        return self.calls
+
+    @property  # type: ignore
+    @cacheable(ttl=60, soft_ttl=-1)
+    def polygon_expired(self) -> int:
+        self.calls += 1
+        return self.calls
+
+
+class CacheableTestCase(SimpleTestCase):
+    def test_single_flight(self):
+        region = SlowRegion()
+        results: List[int] = []
+        threads = [threading.Thread(target=lambda: results.append(region.polygon_slow)) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(region.calls, 1)
+        self.assertEqual(results, [1] * 5)
+
+    def test_soft_ttl(self):
+        region = SlowRegion()
+        self.assertEqual(region.polygon_expired, 1)
+        self.assertEqual(region.polygon_expired, 2)  # refreshed by the lock owner
+
+
+class ActionsConsumer(ReduxConsumer):
+    def __init__(self):  # pylint: disable=super-init-not-called
+        self.calls: List[str] = []
+        self.frames: List = []
+
+    async def base_send(self, message):
+        self.frames.append(json.loads(message['text']))
+
+    @action('ECHO')
+    async def echo(self, message, **kwargs):
+        await self.send_json({'type': 'ECHOED', 'value': message['value']})
+
+    @action('FIRST')
+    async def first(self, message, **kwargs):
+        self.calls.append('first')
+
+    @action('FIRST')
+    async def another_first(self, message, **kwargs):
+        self.calls.append('another_first')
+
+
+class ChunkedConsumer(ActionsConsumer):
+    UNBATCHED = ('CHUNKS',)
+
+    @action('CHUNKS')
+    async def chunks(self, message, **kwargs):
+        for value in message['values']:
+            await self.send_json({'type': 'CHUNK', 'value': value})
+
+
+class OverriddenConsumer(ActionsConsumer):
+    async def first(self, message, **kwargs):
+        self.calls.append('plain')
+
+
+class ReduxConsumerTestCase(SimpleTestCase):
+    def test_dispatch(self):
+        consumer = ActionsConsumer()
+        asyncio.run(consumer.receive_json({'type': 'first'}))
+        self.assertListEqual(consumer.calls, ['another_first', 'first'])
+        with self.assertRaises(NotImplementedError):
+            asyncio.run(consumer.receive_json({'type': 'second'}))
+
+    def test_batch(self):
+        consumer = ActionsConsumer()
+        asyncio.run(consumer.receive_json({'type': 'echo', 'value': 0}))
+        frame = [{'type': 'echo', 'value': 1}, {'type': 'first'}, {'type': 'echo', 'value': 2}]
+        asyncio.run(consumer.receive_json(frame))
+        self.assertListEqual(consumer.frames, [
+            {'type': 'ECHOED', 'value': 0},
+            [{'type': 'ECHOED', 'value': 1}, {'type': 'ECHOED', 'value': 2}],
+        ])
+        self.assertListEqual(consumer.calls, ['another_first', 'first'])
+
+    def test_unbatched(self):
+        consumer = ChunkedConsumer()
+        frame = [{'type': 'echo', 'value': 1}, {'type': 'chunks', 'values': [2, 3]}, {'type': 'echo', 'value': 4}]
+        asyncio.run(consumer.receive_json(frame))
+        self.assertListEqual(consumer.frames, [
+            [{'type': 'ECHOED', 'value': 1}],
+            {'type': 'CHUNK', 'value': 2},
+            {'type': 'CHUNK', 'value': 3},
+            [{'type': 'ECHOED', 'value': 4}],
+        ])
+
+    def test_override(self):
+        self.assertTupleEqual(OverriddenConsumer._actions['FIRST'], ('another_first',))
+
+
+class MetricsTestCase(SimpleTestCase):
+    def test_memory_sink(self):
+        sink = MemorySink()
+        for value in (0.001, 0.002, 0.003, 1.0):
+            sink.observe('ws.action', value, action='CHECK')
+        sink.add('ws.connections', 1, consumer='Puzzle')
+        sink.add('ws.connections', -1, consumer='Puzzle')
+        info = sink.info()
+        histogram = info['histograms']['ws.action,action=CHECK']
+        self.assertEqual(histogram['count'], 4)
+        self.assertEqual(histogram['max'], 1.0)
+        self.assertEqual(histogram['p50'], 2 ** -8)  # upper bound of the bucket
+        self.assertEqual(histogram['p99'], 1.0)
+        self.assertDictEqual(info['counters'], {'ws.connections,consumer=Puzzle': 0})
+
+    def test_consumer(self):
+        asyncio.run(ActionsConsumer().receive_json({'type': 'echo', 'value': 'text'}))
+        histograms = metrics.info()['histograms']
+        self.assertIn('ws.action,action=ECHO', histograms)
+        self.assertIn('ws.section,action=ECHO,section=serialize', histograms)
+        self.assertIn('ws.payload,action=ECHO', histograms)
+
+
+class QueueTestCase(SimpleTestCase):
+    @staticmethod
+    def queued(policy: str, frames: List, dropped: Optional[List] = None) -> List:
+        consumer = ActionsConsumer()
+        consumer._pending, consumer._wakeup = deque(), asyncio.Event()
+        with override_settings(WS_QUEUE_SIZE=2, WS_QUEUE_POLICY=policy, WS_MAX_IDS=3, WS_MAX_BATCH=2):
+            for frame in frames:
+                result = consumer.enqueue(consumer.limit(frame))
+                if dropped is not None:
+                    dropped.extend(result)
+        return list(consumer._pending)
+
+    def test_limit(self):
+        pending = self.queued('drop', [{'type': 'first', 'ids': [1, 2, 3, 4]}, [{'type': 'first'}] * 3])
+        self.assertListEqual(pending, [{'type': 'first', 'ids': [1, 2, 3]}, [{'type': 'first'}] * 2])
+
+    def test_drop(self):
+        frames = [{'type': 'echo', 'value': value} for value in range(3)]
+        dropped: List = []
+        self.assertListEqual(self.queued('drop', frames, dropped), frames[:2])
+        self.assertListEqual(dropped, frames[2:])
+
+    def test_merge(self):
+        frames = [{'type': 'echo', 'value': 0}, {'type': 'first'}, {'type': 'echo', 'value': 0}]
+        self.assertListEqual(self.queued('merge', frames), frames[:2])
+        self.assertListEqual(self.queued('merge', frames + [{'type': 'echo', 'value': 1}]), frames[:2])
+
+
+class CompressedTestCase(SimpleTestCase):
+    def test_compress_payload(self):
+        data = json.dumps(list(range(1000))).encode()
+        payloads = compress_payload(data)
+        self.assertSetEqual(set(payloads), {IDENTITY, 'gzip', 'br'})
+        self.assertEqual(gzip.decompress(payloads['gzip']), data)
+        self.assertDictEqual(compress_payload(b'{}'), {IDENTITY: b'{}'})
+
+    def test_accepted_encoding(self):
+        payloads = {IDENTITY: b'', 'gzip': b'', 'br': b''}
+        self.assertEqual(accepted_encoding('gzip, deflate, br', payloads), 'br')
+        self.assertEqual(accepted_encoding('gzip;q=0.5, br;q=0', payloads), 'gzip')
+        self.assertEqual(accepted_encoding('*', {IDENTITY: b'', 'gzip': b''}), 'gzip')
+        self.assertEqual(accepted_encoding('', payloads), IDENTITY)
@@ -0,0 +1,18 @@
+/**
+ * @jest-environment node
+ */
+'use strict';
+
+import {decodeBinary} from "../games/binary";
+
+// maps.binary.pack_questions of a question and two solved regions, the polygon of the last one is known by the client
+const PACKED = 'R1BaQmkAAAB7InF1ZXN0aW9ucyI6IFt7ImlkIjogMSwgInBvbHlnb24iOiAwfV0sICJzb2x2ZWQiOiBbeyJpZCI6IDIsICJwb2x5Z29uIjo' +
+  'gMX0sIHsiaWQiOiAzLCAicG9seWdvbiI6IG51bGx9XX0CAAAAAAAAAB8AAAApAAAAAgOg/NUDv6S7C8DtGu+TCcCTH7eWQwG++ugD/bSHBwEBvvroA/20hwc=';
+
+it('test decode binary', () => {
+  let bytes = Uint8Array.from(Buffer.from(PACKED, 'base64'));
+  expect(decodeBinary(bytes.buffer)).toEqual({
+    questions: [{id: 1, polygon: ['_p~iF~ps|U_ulLnnqC_mqNvxq`@', '}hnsF|rubM']}],
+    solved: [{id: 2, polygon: ['}hnsF|rubM']}, {id: 3, polygon: null}],
+  });
+});
@@ -0,0 +1,23 @@
+'use strict';
+
+import {knownHashes, resolveMessage, resolveQuestions} from "../games/geometry";
+
+beforeEach(() => {
+  localStorage.clear();
+});
+
+it('test known hashes are ordered by use', () => {
+  resolveQuestions({questions: [{id: 1, hash: 'aaaaaaaaaaaa', polygon: ['a']}],
+                    solved: [{id: 2, hash: 'bbbbbbbbbbbb', polygon: ['b']}]});
+  expect(knownHashes()).toEqual(['aaaaaaaaaaaa', 'bbbbbbbbbbbb']);
+
+  let message = resolveMessage({id: 1, hash: 'aaaaaaaaaaaa', polygon: null});
+  expect(message.polygon).toEqual(['a']);
+  expect(knownHashes()).toEqual(['bbbbbbbbbbbb', 'aaaaaaaaaaaa']);
+});
+
+it('test removed polygons are not reported', () => {
+  resolveMessage({id: 1, hash: 'aaaaaaaaaaaa', polygon: ['a']});
+  localStorage.removeItem('geometry:aaaaaaaaaaaa');
+  expect(knownHashes()).toEqual([]);
+});
@@ -0,0 +1,26 @@
+/**
+ * @jest-environment node
+ */
+'use strict';
+
+import {decodeArc, resolveTopology} from "../games/topology";
+
+// two arcs of one ring: A-B-C and C-D-A
+const ARCS = ['_p~iF~ps|U_ulLnnqC_mqNvxq`@', '_t~fGfzxbW~m}XgxzG~s`B_oh\\'];
+
+it('test decode arc', () => {
+  expect(decodeArc(ARCS[0])).toEqual([[3850000, -12020000], [4070000, -12095000], [4325200, -12645300]]);
+});
+
+it('test resolve topology', () => {
+  let data = {
+    questions: [{id: 1, polygon: [[0, 1]]}],
+    solved: [{id: 2, polygon: [[~1, ~0]]}, {id: 3, polygon: ['}hnsF|rubM']}],
+    arcs: ARCS,
+  };
+  expect(resolveTopology(data)).toEqual({
+    questions: [{id: 1, polygon: ['_p~iF~ps|U_ulLnnqC_mqNvxq`@~m}XgxzG~s`B_oh\\']}],
+    solved: [{id: 2, polygon: ['_p~iF~ps|U_t`B~nh\\_n}XfxzG~lqNwxq`@~tlLonqC']}, {id: 3, polygon: ['}hnsF|rubM']}],
+    arcs: ARCS,
+  });
+});
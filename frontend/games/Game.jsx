@@ -7,9 +7,13 @@ import Toolbox from "./components/Toolbox/index";
 import Infobox from "./components/Infobox/index";
 import Map from '../components/Map/index';
 import {Congratulation} from "./components/Congratulation";
+import {knownHashes, resolveMessage} from "./geometry";
 
 import './index.css';
 
+// milliseconds before an action is sent again when the server was too busy to take it
+const RETRY_DELAY = 1000;
+
 
 class Game extends React.Component {
   constructor(props) {
@@ -18,22 +22,47 @@ class Game extends React.Component {
       congratulations: null,
       map: {typeId: google.maps.MapTypeId.TERRAIN}, wsState: null, showMap: true};
     this.ws = null;
+    this.wsQueue = [];
+    // the server replays solved regions which came after `version` when the socket reconnects
+    this.session = {token: null, version: 0};
   }
 
   wsSend = (payload) => {
+    this.wsQueue.push(payload);
+    if (this.wsQueue.length === 1) {
+      this.wsFlush();
+    }
+  };
+
+  // actions which wait for the connection are sent in one frame
+  wsFlush = () => {
+    if (this.wsQueue.length === 0) {
+      return;
+    }
     if(this.ws && this.ws.isReady() === 1) {
-      this.ws.json(payload);
+      let queue = this.wsQueue;
+      this.wsQueue = [];
+      this.ws.json(queue.length === 1 ? queue[0] : queue);
     } else {
-      setTimeout(() => {this.wsSend(payload);}, 100);
+      setTimeout(this.wsFlush, 100);
     }
   };
 
+  wsResume = () => {
+    this.wsQueue.unshift({type: 'SESSION', token: this.session.token, version: this.session.version,
+                          known: knownHashes(), zoom: this.props.map.zoom});
+    this.wsFlush();
+  };
+
   setupWs = () => {
     let ws_scheme = window.location.protocol === "https:" ? "wss" : "ws";
     let addr = `${ws_scheme}://${window.location.host}/ws/${this.GAME_NAME}/`;
     this.ws = new Sockette(addr, {
       timeout: 5e3,
-      onopen: e => this.setState(state => ({...state, wsState: true})),
+      onopen: e => {
+        this.setState(state => ({...state, wsState: true}));
+        this.wsResume();
+      },
       onmessage: e => this.dispatchMessage(e),
       onreconnect: e => this.setState(state => ({...state, wsState: null})),
       onmaximum: e => this.setState(state => ({...state, wsState: false})),
@@ -48,7 +77,20 @@ class Game extends React.Component {
 
   dispatchMessage = (event) => {
     let data = JSON.parse(event.data);
-    this._dispatchMessage(data);
+    (Array.isArray(data) ? data : [data]).forEach(message => {
+      if (message.type === 'SESSION') {
+        this.session = {token: message.token, version: message.version};
+        return;
+      }
+      if (message.type === 'OVERLOADED') {
+        setTimeout(() => this.wsSend(message.action), RETRY_DELAY);
+        return;
+      }
+      if (message.version !== undefined) {
+        this.session.version = Math.max(this.session.version, message.version);
+      }
+      this._dispatchMessage(resolveMessage(message));
+    });
     if (this.state.regions.every(obj => obj.isSolved)) {
       let score = new Date(Date.now() - this.state.startTime).getSeconds();
       this.setState(state => ({...state, congratulations: {score: score}}));
@@ -2,12 +2,17 @@
 import React from "react";
 import Game from "./Game";
 import {decodePolygon, moveTo, prepareInfobox} from "../utils";
+import {questionsUrl, resolveQuestions} from "./geometry";
+import {readPayload} from "./binary";
+import {resolveArcs, resolveTopology} from "./topology";
 import {Button} from "react-bootstrap";
 import {FormattedMessage as Msg} from "react-intl";
 
 
 class Puzzle extends Game {
   GAME_NAME = 'puzzle';
+  // the puzzle and the shared arcs its polygons refer to
+  topology = {game: null, arcs: undefined};
 
   static extractData(polygons, solved) {
     return polygons.map(country => {
@@ -57,9 +62,11 @@ class Puzzle extends Game {
         this.setState(state => ({...state, regions: regions, infobox: infobox}));
         break;
       case 'PUZZLE_GIVEUP_DONE':
-        regions = regions.map((polygon) => {
-          if (!polygon.isSolved) {
-            let solve = data.solves[polygon.id];
+        // solves come in several messages, so every chunk is applied to the latest state
+        this.setState(state => ({...state, regions: state.regions.map((polygon) => {
+          let solve = data.solves[polygon.id];
+          if (!polygon.isSolved && solve !== undefined) {
+            resolveArcs(solve, this.topology.arcs);
             return {
               ...polygon,
               draggable: false,
@@ -69,15 +76,21 @@ class Puzzle extends Game {
           } else {
             return polygon;
           }
-        });
-        this.setState(state => ({...state, regions: regions, infobox: infobox}));
+        })}));
         break;
     }
   };
 
   loadData = () => {
-    fetch(`${location.pathname}questions/${location.search}`)
-      .then(response => response.json())
+    let params = new URLSearchParams(location.search);
+    params.set('topology', '1');
+    fetch(questionsUrl(params))
+      .then(readPayload)
+      .then(resolveQuestions)
+      .then(data => {
+        this.topology = {game: data.game, arcs: data.arcs};
+        return resolveTopology(data);
+      })
       .then(data => {
         this.startGame({regions: Puzzle.extractData(data.questions, data.solved)});
       })
@@ -88,7 +101,9 @@ class Puzzle extends Game {
 
   giveUp = () => {
     let ids = this.state.regions.filter(obj => (!obj.isSolved)).map(polygon => (polygon.id));
-    return this.wsSend({ids: ids, type: 'PUZZLE_GIVEUP'});
+    // solves refer to the arcs of the game, so shared borders aren't sent again
+    let topology = this.topology.game ? {topology: true, game: this.topology.game} : {};
+    return this.wsSend({ids: ids, type: 'PUZZLE_GIVEUP', ...topology});
   };
 
   refreshMap = () => {
@@ -4,6 +4,8 @@ import {QuizInit} from './components/QuizInit/index';
 import QuizQuestion from './components/QuizQuestion/index';
 import Game from "./Game";
 import {decodePolygon, prepareInfobox, shuffle} from "../utils";
+import {questionsUrl, resolveQuestions} from "./geometry";
+import {readPayload} from "./binary";
 
 
 class Quiz extends Game {
@@ -96,10 +98,11 @@ class Quiz extends Game {
   loadData = (options) => {
     if (options) {
       let quizBy = ['name', 'flag', 'coat_of_arms', 'capital'].filter((param) => options[param]);
-      let get_params = location.search ? location.search + '&' : '?';
-      get_params += 'params=' + quizBy.join();
-      fetch(`${location.pathname}questions/${get_params}`)
-        .then(response => response.json())
+      let params = new URLSearchParams(location.search);
+      params.set('params', quizBy.join());
+      fetch(questionsUrl(params))
+        .then(readPayload)
+        .then(resolveQuestions)
         .then(data => {
           let regions = Quiz.extractData(data.questions, data.solved);
           this.startGame({regions: regions, questions: Quiz.prepareQuestions(data.questions), question: 0});
@@ -0,0 +1,86 @@
+'use strict';
+
+// Decoder of the compact geometry transport, the layout is described in maps/binary.py
+const MAGIC = 'GPZB';
+export const CONTENT_TYPE = 'application/vnd.geopuzzle.geometry';
+
+function readVarints(bytes) {
+  let result = [];
+  let value = 0;
+  let factor = 1;
+  for (let i = 0; i < bytes.length; i++) {
+    // multiplication instead of shifts, so values above 2^31 don't overflow
+    value += (bytes[i] & 0x7f) * factor;
+    if (bytes[i] & 0x80) {
+      factor *= 0x80;
+    } else {
+      result.push(value);
+      value = 0;
+      factor = 1;
+    }
+  }
+  return result;
+}
+
+// the zig-zag encoded delta as characters of a Google-encoded polyline
+export function polylineValue(value) {
+  let result = '';
+  while (value >= 0x20) {
+    result += String.fromCharCode((0x20 | (value % 0x20)) + 63);
+    value = Math.floor(value / 0x20);
+  }
+  return result + String.fromCharCode(value + 63);
+}
+
+export function decodeGeometry(bytes) {
+  let values = readVarints(bytes);
+  let rings = [];
+  let position = 1;
+  for (let i = 0; i < values[0]; i++) {
+    let size = values[position] * 2;
+    rings.push(values.slice(position + 1, position + 1 + size).map(polylineValue).join(''));
+    position += size + 1;
+  }
+  return rings;
+}
+
+// the JSON payload with polygons in place of indices, as it comes without format=binary
+export function decodeBinary(buffer) {
+  let bytes = new Uint8Array(buffer);
+  let view = new DataView(buffer);
+  if (String.fromCharCode(...bytes.subarray(0, 4)) !== MAGIC) {
+    throw new Error('Unknown binary format');
+  }
+  let size = view.getUint32(4, true);
+  let payload = JSON.parse(new TextDecoder().decode(bytes.subarray(8, 8 + size)));
+  let count = view.getUint32(8 + size, true);
+  let section = 12 + size + 4 * (count + 1);
+  let geometries = [];
+  for (let i = 0; i < count; i++) {
+    let start = view.getUint32(12 + size + 4 * i, true);
+    let end = view.getUint32(12 + size + 4 * (i + 1), true);
+    geometries.push(decodeGeometry(bytes.subarray(section + start, section + end)));
+  }
+
+  let resolve = item => {
+    if (typeof item.polygon === 'number') {
+      item.polygon = geometries[item.polygon];
+    }
+  };
+  if (typeof payload.arcs === 'number') {
+    payload.arcs = geometries[payload.arcs];
+  } else if (payload.questions !== undefined) {
+    payload.questions.forEach(resolve);
+    payload.solved.forEach(resolve);
+  } else {
+    resolve(payload);
+  }
+  return payload;
+}
+
+export function readPayload(response) {
+  if ((response.headers.get('Content-Type') || '').startsWith(CONTENT_TYPE)) {
+    return response.arrayBuffer().then(decodeBinary);
+  }
+  return response.json();
+}
@@ -0,0 +1,82 @@
+'use strict';
+
+// Encoded polygons by their hash, shared by all games, see maps/dedup.py
+const PREFIX = 'geometry:';
+// hashes of the stored polygons, the recently used ones are at the end
+const INDEX = 'geometry-index';
+// reported hashes are limited, so the request stays short
+const MAX_KNOWN = 300;
+// polygons which weren't used for longer are removed from the storage
+const MAX_STORED = 3000;
+
+function readIndex() {
+  try {
+    return JSON.parse(localStorage.getItem(INDEX)) || [];
+  } catch (e) {
+    return [];
+  }
+}
+
+// moves the hashes to the end of the index, so they are reported first
+function touch(hashes) {
+  if (hashes.length === 0) {
+    return;
+  }
+  try {
+    let used = new Set(hashes);
+    let index = readIndex().filter(hash => !used.has(hash)).concat([...used]);
+    index.splice(0, Math.max(index.length - MAX_STORED, 0)).forEach(hash => localStorage.removeItem(PREFIX + hash));
+    localStorage.setItem(INDEX, JSON.stringify(index));
+  } catch (e) {
+    // storage is disabled or full, the order is kept from the previous time
+  }
+}
+
+export function knownHashes() {
+  try {
+    return readIndex().filter(hash => localStorage.getItem(PREFIX + hash) !== null).slice(-MAX_KNOWN);
+  } catch (e) {
+    // storage is disabled, every polygon is downloaded
+    return [];
+  }
+}
+
+export function resolvePolygon(item) {
+  if (item.hash === undefined) {
+    return item;
+  }
+  if (item.polygon === null) {
+    // only hashes reported by knownHashes are stripped by the server
+    item.polygon = JSON.parse(localStorage.getItem(PREFIX + item.hash)) || [];
+  } else {
+    try {
+      localStorage.setItem(PREFIX + item.hash, JSON.stringify(item.polygon));
+    } catch (e) {
+      // storage is full, the polygon will be downloaded again next time
+    }
+  }
+  return item;
+}
+
+function resolveAll(items) {
+  items.forEach(resolvePolygon);
+  touch(items.filter(item => item.hash !== undefined).map(item => item.hash));
+}
+
+export function resolveMessage(message) {
+  resolveAll(message.solves ? [message, ...Object.values(message.solves)] : [message]);
+  return message;
+}
+
+export function questionsUrl(params) {
+  let search = new URLSearchParams(params);
+  search.set('hashes', '1');
+  search.set('format', 'binary');
+  search.set('known', knownHashes().join());
+  return `${location.pathname}questions/?${search.toString()}`;
+}
+
+export function resolveQuestions(data) {
+  resolveAll([...(data.questions || []), ...(data.solved || [])]);
+  return data;
+}
@@ -0,0 +1,63 @@
+'use strict';
+import {polylineValue} from "./binary";
+
+// Rings made of shared arcs, the layout is described in maps/topology.py
+
+// points of a Google-encoded polyline as integer [lat, lng] pairs, 1e-5 degree units
+export function decodeArc(encoded) {
+  let points = [];
+  let values = [];
+  let value = 0;
+  let factor = 1;
+  for (let i = 0; i < encoded.length; i++) {
+    let chunk = encoded.charCodeAt(i) - 63;
+    value += (chunk & 0x1f) * factor;
+    if (chunk & 0x20) {
+      factor *= 0x20;
+      continue;
+    }
+    values.push(value % 2 ? -(value + 1) / 2 : value / 2);
+    value = 0;
+    factor = 1;
+  }
+  let lat = 0;
+  let lng = 0;
+  for (let i = 0; i + 1 < values.length; i += 2) {
+    lat += values[i];
+    lng += values[i + 1];
+    points.push([lat, lng]);
+  }
+  return points;
+}
+
+// the ring as one encoded polyline, `~index` is the arc in the reverse direction
+export function decodeRing(ring, arcs) {
+  let result = '';
+  let previous = [0, 0];
+  ring.forEach((index, position) => {
+    let points = index < 0 ? decodeArc(arcs[~index]).reverse() : decodeArc(arcs[index]);
+    // consecutive arcs share their end points
+    points.slice(position === 0 ? 0 : 1).forEach(point => {
+      for (let i = 0; i < 2; i++) {
+        let delta = point[i] - previous[i];
+        result += polylineValue(delta < 0 ? -2 * delta - 1 : 2 * delta);
+      }
+      previous = point;
+    });
+  });
+  return result;
+}
+
+export function resolveArcs(item, arcs) {
+  // regions outside the game come with their own polylines
+  if (arcs !== undefined && Array.isArray(item.polygon) && Array.isArray(item.polygon[0])) {
+    item.polygon = item.polygon.map(ring => decodeRing(ring, arcs));
+  }
+  return item;
+}
+
+export function resolveTopology(data) {
+  (data.questions || []).forEach(item => resolveArcs(item, data.arcs));
+  (data.solved || []).forEach(item => resolveArcs(item, data.arcs));
+  return data;
+}
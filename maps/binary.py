@@ -0,0 +1,103 @@
+"""Compact binary transport for region geometry.
+
+Layout, all fixed size integers are little-endian uint32:
+
+    b'GPZB'                     magic
+    N                           length of the JSON header
+    N bytes                     JSON header, every polygon is replaced by its index in the offsets table
+    M                           amount of geometries
+    M + 1 offsets               start of each geometry relative to the geometry section
+    geometry section            per geometry: varint ring count, then for each ring varint point count
+                                followed by zig-zag deltas of (latitude, longitude) * 1e5 as varints
+
+Deltas are the same values as in Google-encoded polylines, so cached polylines
+are transcoded in bulk without decoding the points.
+"""
+import json
+import struct
+from typing import Dict, List, Tuple, Iterable
+
+import numpy
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+from .converter import polyline_values, encode_values, join_chunks, split_chunks
+
+MAGIC = b'GPZB'
+CONTENT_TYPE = 'application/vnd.geopuzzle.geometry'
+VARINT_BITS = 7
+VARINT_FLAG = 0x80
+
+Geometry = List[str]
+
+
+def pack_geometry(rings: Geometry) -> bytes:
+    values = [numpy.array([len(rings)], dtype=numpy.int64)]
+    for ring in rings:
+        ring_values = polyline_values(ring)
+        values.append(numpy.array([len(ring_values) // 2], dtype=numpy.int64))
+        values.append(ring_values)
+    return join_chunks(numpy.concatenate(values), VARINT_BITS, VARINT_FLAG).tobytes()
+
+
+def unpack_geometry(data: bytes) -> Geometry:
+    values = split_chunks(numpy.frombuffer(data, dtype=numpy.uint8), VARINT_BITS, VARINT_FLAG)
+    result = []
+    position = 1
+    for _ in range(values[0]):
+        size = int(values[position]) * 2
+        result.append(encode_values(values[position + 1:position + 1 + size]))
+        position += size + 1
+    return result
+
+
+def _extract(items: Iterable[Dict], geometries: List[Geometry]) -> None:
+    for item in items:
+        if item['polygon'] is None:  # the client has it by hash
+            continue
+        geometries.append(item['polygon'])
+        item['polygon'] = len(geometries) - 1
+
+
+def pack(header: Dict, geometries: List[Geometry]) -> bytes:
+    packed = [pack_geometry(geometry) for geometry in geometries]
+    offsets = numpy.cumsum([0] + [len(item) for item in packed]).astype('<u4')
+    meta = json.dumps(header, cls=DjangoJSONEncoder).encode()
+    return b''.join((MAGIC, struct.pack('<I', len(meta)), meta, struct.pack('<I', len(packed)),
+                     offsets.tobytes(), *packed))
+
+
+def unpack(data: bytes) -> Tuple[Dict, List[Geometry]]:
+    if data[:4] != MAGIC:
+        raise ValueError('Unknown binary format')
+    (size,) = struct.unpack_from('<I', data, 4)
+    header = json.loads(data[8:8 + size])
+    (count,) = struct.unpack_from('<I', data, 8 + size)
+    offsets = numpy.frombuffer(data, dtype='<u4', count=count + 1, offset=12 + size)
+    section = memoryview(data)[12 + size + offsets.nbytes:]
+    geometries = [unpack_geometry(section[offsets[i]:offsets[i + 1]]) for i in range(count)]
+    return header, geometries
+
+
+def pack_questions(payload: Dict) -> bytes:
+    geometries: List[Geometry] = []
+    if 'arcs' in payload:
+        # polygons are already references to the shared arcs
+        geometries.append(payload['arcs'])
+        payload['arcs'] = 0
+    else:
+        _extract(payload['questions'], geometries)
+        _extract(payload['solved'], geometries)
+    return pack(payload, geometries)
+
+
+def pack_region(info: Dict) -> bytes:
+    geometries: List[Geometry] = []
+    _extract([info], geometries)
+    return pack(info, geometries)
+
+
+class BinaryResponse(HttpResponse):
+    def __init__(self, content: bytes, **kwargs):
+        kwargs.setdefault('content_type', CONTENT_TYPE)
+        super().__init__(content=content, **kwargs)
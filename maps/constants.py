@@ -15,6 +15,21 @@ class Zoom(enum.Enum):
     REGION = 9
 
 
+def zoom_tolerance(zoom: int) -> float:
+    """Size of one screen pixel in degrees on the given zoom (256px tiles)."""
+    return 360.0 / (256 * 2 ** int(zoom))
+
+
+def zoom_cache(zoom: int) -> str:
+    """Name of the cache with the region polygon for the zoom, every level has its own key."""
+    return f'polygon_zoom_{Zoom(zoom).name}'
+
+
+def hash_cache(polygon: str) -> str:
+    """Name of the cache with the hash of the polygon cache, the hash is kept and invalidated with its level."""
+    return f'{polygon}_hash'
+
+
 class IndexPageGame(TypedDict):
     id: int
     image: str
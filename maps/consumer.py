@@ -1,36 +1,152 @@
-from typing import Iterable, Tuple
+import secrets
+from typing import Iterable, Tuple, Dict, List, Any, Optional, Set
 
-from channels.db import database_sync_to_async
 from django import forms
+from django.conf import settings
 from django.utils.translation.trans_real import get_supported_language_variant, parse_accept_lang_header
 
-from common.consumer import ReduxConsumer
+from common.async_cachable import async_redis, limited_sync_to_async
+from common.consumer import ReduxConsumer, action
+from common.metrics import section
+from .constants import Zoom, hash_cache, zoom_cache
+from .dedup import parse_known, strip_known
+from .models import AsyncRegionCache
 
 
 class GameConsumer(ReduxConsumer):
     PREFIX: str
     form: forms.Form
 
-    @database_sync_to_async
-    def get_object(self, pk: int):
-        raise NotImplementedError()
+    # loaded for every region with the polygon of the game zoom and its hash, see `caches`
+    CACHES: Tuple[str, ...] = ('polygon_infobox',)
 
-    @database_sync_to_async
-    def check_form(self, form: forms.Form) -> bool:
-        return form.is_valid()
+    # Redis list of solved regions in order of messages, they are sent again if the client missed them
+    SESSION_KEY = 'game_events:{token}'
+
+    _prefetched: Dict[int, AsyncRegionCache] = {}
+    token: Optional[str] = None
+    # hashes of polygons the client reported, None if it doesn't keep them
+    known: Optional[Set[str]] = None
+    # zoom of the game the client reported, polygons are simplified for it; `polygon_gmap` is sent without it
+    zoom: Optional[int] = None
+
+    def caches(self) -> Tuple[str, ...]:
+        polygon = 'polygon_gmap' if self.zoom is None else zoom_cache(self.zoom)
+        return (*self.CACHES, polygon, hash_cache(polygon))
+
+    @staticmethod
+    def parse_zoom(value: Any) -> Optional[int]:
+        try:
+            return Zoom(int(value)).value
+        except (TypeError, ValueError):
+            return None
+
+    def strip_known(self, infos: Iterable[Dict]) -> None:
+        # the sent polygons aren't added: the client may fail to store them
+        if self.known is not None:
+            strip_known(infos, self.known)
+
+    async def get_object(self, pk: int) -> AsyncRegionCache:
+        if int(pk) in self._prefetched:
+            return self._prefetched[int(pk)]
+        with section('cache'):
+            return await AsyncRegionCache.load(pk, self.caches())
+
+    async def prefetch(self, actions: List[Dict]) -> None:
+        pks = {int(content['id']) for content in actions if 'id' in content}
+        with section('cache'):
+            data = await AsyncRegionCache.async_bulk_cache((name, pk) for pk in pks for name in self.caches())
+        values: Dict[int, Dict[str, Any]] = {}
+        for (name, pk), value in data.items():
+            values.setdefault(pk, {})[name] = value
+        self._prefetched = {pk: AsyncRegionCache(pk, region_values) for pk, region_values in values.items()}
+
+    async def receive_batch(self, actions: List[Dict], multiplexer=None) -> None:
+        try:
+            await super().receive_batch(actions, multiplexer=multiplexer)
+        finally:
+            self._prefetched = {}
+
+    async def check_form(self, form: forms.Form) -> bool:
+        with section('db'):
+            return await limited_sync_to_async(form.is_valid)()
+
+    async def record(self, message: Dict, pks: List[int], grouped: bool = False, game: Optional[int] = None) -> None:
+        """Appends the solved regions of the message to the session, `version` of the message is its position.
+
+        `game` is the puzzle whose topology the polygons of the message refer to."""
+        if self.token is None:
+            return
+        event = {'type': message['type'], 'ids': [int(pk) for pk in pks], 'grouped': grouped}
+        if game is not None:
+            event['game'] = game
+        with section('cache'):
+            message['version'] = await async_redis.push(self.SESSION_KEY.format(token=self.token), event,
+                                                        settings.GAME_SESSION_TTL)
+
+    async def get_solves(self, pks: List[int],
+                         game: Optional[int] = None) -> List[Dict]:  # pylint: disable=unused-argument
+        """Full info for regions, see `PuzzleConsumer.get_solves` for `game`."""
+        with section('cache'):
+            return await AsyncRegionCache.async_bulk_full_info(pks, self.scope['lang'], self.zoom)
+
+    async def replay(self, events: List[Dict], version: int) -> List[Dict]:
+        infos = {info['id']: info for info in
+                 await self.get_solves([pk for event in events if 'game' not in event for pk in event['ids']])}
+        result = []
+        for position, event in enumerate(events, start=version + 1):
+            solves = infos
+            if 'game' in event:  # the same references to arcs as in the original message
+                solves = {info['id']: info for info in await self.get_solves(event['ids'], event['game'])}
+            self.strip_known(solves[pk] for pk in event['ids'])
+            if event['grouped']:
+                result.append({'type': event['type'], 'version': position,
+                               'solves': {pk: solves[pk] for pk in event['ids']}})
+            else:
+                result.extend({**solves[pk], 'type': event['type'], 'version': position} for pk in event['ids'])
+        return result
+
+    @action('SESSION')
+    async def resume(self, message: dict, *args, **kwargs):
+        """Starts a session or continues it after a reconnect sending the messages the client hasn't got."""
+        if 'zoom' in message:
+            self.zoom = self.parse_zoom(message['zoom'])
+        if 'known' in message:
+            self.known = parse_known(','.join(message['known']))
+        length = 0
+        if message.get('token'):
+            with section('cache'):
+                length = await async_redis.length(self.SESSION_KEY.format(token=message['token']))
+        version, events = 0, []
+        if length == 0:  # a new session, an expired one or one without solved regions
+            self.token = secrets.token_urlsafe(16)
+        else:
+            self.token = message['token']
+            version = min(int(message.get('version') or 0), length)
+            with section('cache'):
+                events = await async_redis.range(self.SESSION_KEY.format(token=self.token), version)
+        replies = await self.replay(events, version)
+        # the version grows with the replayed messages, so a drop in the middle isn't lost
+        await self.send_json([{'type': 'SESSION', 'token': self.token, 'version': version}, *replies])
 
     async def _give_up(self, pk: int):
         region = await self.get_object(pk)
-        result = region.full_info(self.scope['lang'])
+        result = region.full_info(self.scope['lang'], self.zoom)
         result['type'] = f'{self.PREFIX}_GIVEUP_DONE'
+        self.strip_known([result])
+        await self.record(result, [pk])
         await self.send_json(result)
 
     async def _check(self, pk: int, *args, **kwargs):
         region = await self.get_object(pk)
         form = self.form(area=region, **kwargs)
-        if await self.check_form(form):
-            result = region.full_info(self.scope['lang'])
+        with section('form'):  # includes `db` when the form goes to the database
+            valid = await self.check_form(form)
+        if valid:
+            result = region.full_info(self.scope['lang'], self.zoom)
             result['type'] = f'{self.PREFIX}_CHECK_SUCCESS'
+            self.strip_known([result])
+            await self.record(result, [pk])
             await self.send_json(result)
 
     async def connect(self):
@@ -1,10 +1,11 @@
 """Provides utility functions for encoding and decoding linestrings using the
 Google encoded polyline algorithm.
 """
-import json
 import math
+import struct
 from typing import Tuple, List, Union, Iterable, Optional
 
+import numpy
 from django.contrib.gis.geos import MultiPolygon, Polygon
 
 Point = Tuple[float, float]
@@ -43,6 +44,73 @@ def encode_coords(coords: PointList) -> str:
     return ''.join(c for r in result for c in r)
 
 
+def encode_array(coords: numpy.ndarray) -> str:
+    """Vectorized variant of `encode_coords`.
+
+    Takes an (N, 2) array of (longitude, latitude) pairs and returns exactly the same
+    string as `encode_coords` would. Quantization, deltas, zig-zag and 5-bit chunking
+    are done on the whole buffer at once instead of point by point.
+    """
+    coords = numpy.asarray(coords, dtype=numpy.float64).reshape(-1, 2)
+    # int(value * 1e5) truncates towards zero, numpy.trunc does the same
+    return encode_quantized(numpy.trunc(coords[:, ::-1] * 1e5).astype(numpy.int64))
+
+
+def encode_quantized(values: numpy.ndarray) -> str:
+    """Encodes an (N, 2) integer array of already quantized (latitude, longitude) pairs."""
+    if len(values) == 0:
+        return ''
+
+    deltas = numpy.diff(values, axis=0, prepend=numpy.zeros((1, 2), dtype=numpy.int64)).ravel()
+    zigzag = numpy.where(deltas < 0, ~(deltas << 1), deltas << 1)
+    return encode_values(zigzag)
+
+
+def encode_values(values: numpy.ndarray) -> str:
+    """Builds a polyline from zig-zag encoded deltas, the reverse of `polyline_values`."""
+    return (join_chunks(values, 5, 0x20) + 63).tobytes().decode('ascii')
+
+
+def polyline_values(point_str: str) -> numpy.ndarray:
+    """Zig-zag encoded deltas of a polyline, in order: latitude, longitude."""
+    return split_chunks(numpy.frombuffer(point_str.encode('ascii'), dtype=numpy.uint8) - 63, 5, 0x20)
+
+
+def join_chunks(values: numpy.ndarray, bits: int, flag: int) -> numpy.ndarray:
+    """Splits non-negative values into `bits`-wide chunks, least significant first.
+
+    Every chunk except the last one of a value is marked with `flag`. This is
+    the layout of both polylines (5 bits) and varints (7 bits).
+    """
+    values = numpy.asarray(values, dtype=numpy.int64)
+    if len(values) == 0:
+        return numpy.empty(0, dtype=numpy.uint8)
+
+    # the amount of chunks for each value, at least one
+    lengths = numpy.ones(len(values), dtype=numpy.int64)
+    rest = values >> bits
+    while rest.any():
+        lengths += rest > 0
+        rest >>= bits
+
+    positions = numpy.arange(lengths.max(), dtype=numpy.int64)
+    chunks = (values[:, None] >> (positions * bits)) & (flag - 1)
+    chunks |= numpy.where(positions < lengths[:, None] - 1, flag, 0)
+    return chunks[positions < lengths[:, None]].astype(numpy.uint8)
+
+
+def split_chunks(data: numpy.ndarray, bits: int, flag: int) -> numpy.ndarray:
+    """Joins chunks produced by `join_chunks` back into values."""
+    if len(data) == 0:
+        return numpy.empty(0, dtype=numpy.int64)
+
+    ends = (data & flag) == 0
+    first = numpy.concatenate(([True], ends[:-1]))
+    starts = numpy.flatnonzero(first)
+    positions = numpy.arange(len(data)) - starts[numpy.cumsum(first) - 1]
+    return numpy.add.reduceat((data & (flag - 1)).astype(numpy.int64) << (positions * bits), starts)
+
+
 def _split_into_chunks(value: int) -> Iterable[int]:
     while value >= 32:  # 2^5, while there are at least 5 bits
 
@@ -128,43 +196,89 @@ def decode(point_str: str) -> List[Point]:
     return points
 
 
-def encode_geometry(polygon: Union[Polygon, MultiPolygon], min_points: Optional[int] = None) -> List[str]:
-    def encode_part(subpolygon: Polygon) -> List[str]:
-        subpart = [encode_coords(subpolygon.coords[0])]
-        if len(subpolygon.coords) > 1:
-            subpart.append(encode_coords(subpolygon.coords[1]))
-        return subpart
+WkbPart = List[numpy.ndarray]
 
-    result: List[str] = []
-    if isinstance(polygon, MultiPolygon):
-        for part in polygon:
-            if min_points is not None and part.num_points < min_points:
-                continue
-            result += encode_part(part)
-    else:
-        result += encode_part(polygon)
-    return result if len(result) > 0 else encode_geometry(polygon)
 
+def read_wkb(wkb: Union[bytes, memoryview]) -> Tuple[bool, List[WkbPart]]:
+    """Reads rings of a (Multi)Polygon from (E)WKB without creating GEOS objects.
 
-def encode_geojson(polygon: Union[Polygon, MultiPolygon], min_points: Optional[int] = None) -> List[List[str]]:
-    def encode_part(polygon) -> List[str]:
-        result = []
-        for subp in polygon:
-            if min_points is not None and len(subp) < min_points:
-                continue
-            result.append(encode_coords(subp))
+    Rings are (N, 2) arrays of (longitude, latitude) which share memory with `wkb`.
+    Returns a flag whether the geometry is a MultiPolygon and the list of parts.
+    """
+    data = memoryview(wkb)
+
+    def read(offset: int) -> Tuple[bool, List[WkbPart], int]:
+        order = '<' if data[offset] == 1 else '>'
+        (kind,) = struct.unpack_from(order + 'I', data, offset + 1)
+        offset += 5
+        if kind & 0x20000000:  # EWKB with SRID
+            offset += 4
+        # extra Z/M ordinates are flagged either by EWKB high bits or by ISO thousands
+        dims = 2 + bool(kind & 0x80000000) + bool(kind & 0x40000000) + (0, 1, 1, 2)[(kind & 0xffff) // 1000]
+        kind = (kind & 0xffff) % 1000
+        (count,) = struct.unpack_from(order + 'I', data, offset)
+        offset += 4
+        if kind == 6:
+            parts = []
+            for _ in range(count):
+                _, subparts, offset = read(offset)
+                parts += subparts
+            return True, parts, offset
+        if kind != 3:
+            raise ValueError(f'Unsupported WKB geometry type {kind}')
+        rings = []
+        for _ in range(count):
+            (size,) = struct.unpack_from(order + 'I', data, offset)
+            offset += 4
+            ring = numpy.frombuffer(data, dtype=order + 'f8', count=size * dims, offset=offset)
+            rings.append(ring.reshape(size, dims)[:, :2])
+            offset += ring.nbytes
+        return False, [rings], offset
+
+    is_multi, parts, _ = read(0)
+    return is_multi, parts
+
+
+def _wkb_area(rings: WkbPart) -> float:
+    def ring_area(ring: numpy.ndarray) -> float:
+        x, y = ring[:, 0], ring[:, 1]
+        return abs(numpy.dot(x[:-1], y[1:]) - numpy.dot(x[1:], y[:-1])) / 2
+
+    return ring_area(rings[0]) - sum(ring_area(ring) for ring in rings[1:]) if rings else 0.0
+
+
+def encode_geometry(polygon: Union[Polygon, MultiPolygon], min_points: Optional[int] = None,
+                    min_area: Optional[float] = None) -> List[str]:
+    return encode_wkb(polygon.wkb, min_points=min_points, min_area=min_area)
+
+
+def encode_wkb(wkb: Union[bytes, memoryview], min_points: Optional[int] = None,
+               min_area: Optional[float] = None) -> List[str]:
+    """The same as `encode_geometry`, but works with WKB of the (Multi)Polygon.
+
+    Only the exterior and the first hole of each part are encoded. Parts of a
+    MultiPolygon with less than `min_points` points or smaller than `min_area`
+    are skipped unless nothing is left after that.
+    """
+    is_multi, parts = read_wkb(wkb)
+    result: List[str] = []
+    for rings in parts:
+        if is_multi and min_points is not None and sum(len(ring) for ring in rings) < min_points:
+            continue
+        if is_multi and min_area is not None and _wkb_area(rings) < min_area:
+            continue
+        result += [encode_array(ring) for ring in rings[:2]]
+    if len(result) > 0 or (min_points is None and min_area is None):
         return result
+    return encode_wkb(wkb)
 
-    result: List[List[str]] = []
-    coords = json.loads(polygon.geojson)
-    if isinstance(polygon, MultiPolygon):
-        for part in coords['coordinates']:
-            encoded = encode_part(part)
-            if encoded:
-                result += encoded
-    else:
-        result += encode_part(coords['coordinates'])
-    return result if len(result) > 0 else encode_geojson(polygon)
+
+def encode_geojson(polygon: Union[Polygon, MultiPolygon], min_points: Optional[int] = None) -> List[str]:
+    """Encodes every ring of the polygon skipping rings with less than `min_points` points."""
+    _, parts = read_wkb(polygon.wkb)
+    result = [encode_array(ring) for rings in parts for ring in rings
+              if min_points is None or len(ring) >= min_points]
+    return result if len(result) > 0 or min_points is None else encode_geojson(polygon)
 
 
 def normalize_polygon(polygon: Union[Polygon, MultiPolygon], precision) -> Union[Polygon, MultiPolygon]:
@@ -0,0 +1,34 @@
+"""Content-addressed geometry: the client keeps polygons by hash and reports the
+hashes it has, so the same polygon is downloaded once across sessions and games.
+
+Every item with an encoded polygon gets its `hash` (usually the one cached in
+`hash_cache` of its level), the polygon itself is replaced by None when the
+client reported it has the hash.
+"""
+import hashlib
+from typing import Dict, Iterable, List, Set
+
+HASH_LENGTH = 12
+
+
+def geometry_hash(polygon: List[str]) -> str:
+    return hashlib.sha1('\n'.join(polygon).encode('ascii')).hexdigest()[:HASH_LENGTH]
+
+
+def parse_known(value: str) -> Set[str]:
+    return {item for item in value.split(',') if len(item) == HASH_LENGTH}
+
+
+def strip_known(items: Iterable[Dict], known: Set[str]) -> Set[str]:
+    """Sets `hash` of the items and drops polygons from `known`, returns hashes of the items."""
+    result = set()
+    for item in items:
+        polygon = item.get('polygon')
+        if not polygon or not isinstance(polygon[0], str):  # nothing to strip or references to topology arcs
+            continue
+        if 'hash' not in item:
+            item['hash'] = geometry_hash(polygon)
+        if item['hash'] in known:
+            item['polygon'] = None
+        result.add(item['hash'])
+    return result
@@ -0,0 +1,98 @@
+"""Derived region geometry computed by PostGIS for many regions at once.
+
+The polygons never leave the database: simplification, polyline encoding,
+extent and centre are computed in one statement and only the final cache
+values come back, one JSON object per region.
+
+The levels mirror `Region.polygon_strip`, `polygon_gmap` and `polygon_zoom_*`.
+`ST_AsEncodedPolyline` rounds coordinates while `encode_geometry` truncates
+them, so the polylines may differ from the Python ones by 1e-5 degree.
+"""
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from django.db import connection
+
+from .constants import Zoom, zoom_cache, zoom_tolerance
+
+
+class Level(NamedTuple):
+    name: str
+    # tolerance is base + factor * area of the source polygon
+    base: float
+    factor: float
+    min_points: Optional[int]
+    min_area: Optional[float]
+
+
+LEVELS: List[Level] = [
+    Level('polygon_strip', 0.01, 0.004 / 10.0, 10, None),
+    Level('polygon_gmap', 0.005, 0.001 / 100.0, None, None),
+    *(Level(zoom_cache(zoom), zoom_tolerance(zoom), 0.0, None, (2 * zoom_tolerance(zoom)) ** 2) for zoom in Zoom),
+]
+
+ALL_LEVELS = [level.name for level in LEVELS]
+
+DERIVED_SQL = """WITH source AS (
+    SELECT id, polygon::geometry AS geom FROM maps_region
+    WHERE id = ANY(%(ids)s) AND NOT ST_IsEmpty(polygon::geometry)
+), level AS (
+    SELECT * FROM unnest(%(names)s::text[], %(bases)s::float8[], %(factors)s::float8[],
+                         %(min_points)s::int[], %(min_areas)s::float8[])
+        AS level(name, base, factor, min_points, min_area)
+), part AS (
+    SELECT source.id, level.name, dump.path[1] AS n, dump.geom,
+           (level.min_points IS NULL OR ST_NPoints(dump.geom) >= level.min_points)
+           AND (level.min_area IS NULL OR ST_Area(dump.geom) >= level.min_area) AS passed
+    FROM source CROSS JOIN level,
+         ST_Dump(ST_SimplifyPreserveTopology(source.geom, level.base + level.factor * ST_Area(source.geom))) AS dump
+), kept AS (
+    SELECT *, bool_or(passed) OVER (PARTITION BY id, name) AS any_passed FROM part
+), rings AS (
+    SELECT kept.id, kept.name, jsonb_agg(ring.line ORDER BY kept.n, ring.hole) AS lines
+    FROM kept, LATERAL (VALUES (0, ST_AsEncodedPolyline(ST_ExteriorRing(kept.geom))),
+                               (1, ST_AsEncodedPolyline(ST_InteriorRingN(kept.geom, 1)))) AS ring(hole, line)
+    WHERE (kept.passed OR NOT kept.any_passed) AND ring.line IS NOT NULL
+    GROUP BY kept.id, kept.name
+), center_point AS (
+    SELECT part.id, ST_NPoints(part.geom) > 10 AS large, point.geom
+    FROM part, ST_DumpPoints(ST_ExteriorRing(part.geom)) AS point
+    WHERE part.name = 'polygon_strip'
+), center AS (
+    SELECT id, CASE WHEN bool_or(large)
+                    THEN json_build_array(avg(ST_X(geom)) FILTER (WHERE large), avg(ST_Y(geom)) FILTER (WHERE large))
+                    ELSE json_build_array(avg(ST_X(geom)), avg(ST_Y(geom))) END AS value
+    FROM center_point GROUP BY id
+), bounds AS (
+    SELECT id, ST_Extent(geom) AS box FROM source GROUP BY id
+)
+SELECT source.id, jsonb_build_object(
+    'polygon_bounds', jsonb_build_array(ST_XMin(bounds.box), ST_YMin(bounds.box),
+                                        ST_XMax(bounds.box), ST_YMax(bounds.box)),
+    'polygon_center', center.value
+) || COALESCE((SELECT jsonb_object_agg(rings.name, rings.lines) FROM rings WHERE rings.id = source.id), '{}')
+FROM source JOIN bounds ON bounds.id = source.id LEFT JOIN center ON center.id = source.id"""
+
+
+def derive_geometry(pks: Iterable[int], names: Optional[Iterable[str]] = None) -> Dict[int, Dict[str, Any]]:
+    """Values of the geometry caches for each region, regions with empty polygons are skipped.
+
+    Only the levels in `names` are simplified, all of them by default."""
+    pks = [int(pk) for pk in pks]
+    if not pks:
+        return {}
+    wanted = set(names if names is not None else ('polygon_bounds', 'polygon_center', *ALL_LEVELS))
+    # the centre is averaged over the points of the strip level
+    levels = [level for level in LEVELS
+              if level.name in wanted or (level.name == 'polygon_strip' and 'polygon_center' in wanted)]
+    params = {
+        'ids': pks,
+        'names': [level.name for level in levels],
+        'bases': [level.base for level in levels],
+        'factors': [level.factor for level in levels],
+        'min_points': [level.min_points for level in levels],
+        'min_areas': [level.min_area for level in levels],
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(DERIVED_SQL, params)
+        return {pk: {name: value for name, value in values.items() if name in wanted}
+                for pk, values in cursor.fetchall()}
@@ -1,14 +1,20 @@
 from __future__ import annotations
 
 import logging
+import random
+from typing import List, Optional
 
 from django import forms
 from django.conf import settings
-from django.db.models import QuerySet
+from django.db.models import Prefetch, QuerySet
 
+from common.constants import GameQuestions
 from common.logging import InMemoryHandler
+from common.utils import get_language
 from .constants import OsmRegionData
-from .models import Region, Game
+from .models import Region, RegionTranslation, Game
+from .models.region import EMPTY_NAME
+from .streaming import Section
 from .wambachers import Wambachers, WambachersNode
 from .wikidata import Wikidata
 
@@ -29,6 +35,45 @@ class RegionForm(forms.Form):
             return self.cleaned_data['id']
         return self.game.regions.order_by('?')
 
+    def region_list(self) -> List[Region]:
+        """Regions in random order with their translations to the current language, two queries for any game.
+
+        See `translation`, unlike `Region.translation` nothing is created for missing translations.
+        """
+        translations = RegionTranslation.objects.filter(language_code=get_language())
+        regions = list(self.regions.order_by().prefetch_related(
+            Prefetch('translations', queryset=translations, to_attr='current_translations')))
+        random.shuffle(regions)
+        return regions
+
+    def variant(self) -> Optional[str]:
+        """Parameters which the question set depends on, None if the set isn't cached, see `maps.questions`."""
+        if len(self.cleaned_data['id']) > 0:
+            return None
+        return f"{get_language()}_{self.cleaned_data.get('map', '')}"
+
+    def sections(self) -> List[Section]:
+        """The same as `json`, but items are produced while they are read, see `maps.streaming`."""
+        raise NotImplementedError()
+
+    def personalize(self, questions: GameQuestions) -> GameQuestions:
+        """A copy of the cached set for one request with shuffled questions."""
+        result = questions.copy()
+        result['questions'] = [item.copy() for item in questions['questions']]
+        result['solved'] = [item.copy() for item in questions['solved']]
+        random.shuffle(result['questions'])
+        return result
+
+    @staticmethod
+    def translation(region: Region) -> Optional[RegionTranslation]:
+        """The translation loaded by `region_list`."""
+        return region.current_translations[0] if region.current_translations else None
+
+    @classmethod
+    def name(cls, region: Region) -> str:
+        trans = cls.translation(region)
+        return EMPTY_NAME if trans is None else trans.name
+
 
 class UpdateRegionForm(forms.Form):
     recursive = forms.BooleanField(required=False)
@@ -1,25 +1,44 @@
 import json
+from typing import Iterable, List
 
 from django.core.cache import cache
 from django.core.management import BaseCommand, CommandError
 from tqdm import tqdm
 
-from maps.models import Region
+from common.cachable import invalidate_many
+from maps.constants import hash_cache
+from maps.models import Region, RegionGeometry
+from maps.models.region import geometry_storage
 from mercator.settings.settings import POLYGON_CACHE_KEY
 
+CHUNK_SIZE = 50
+
 
 class Command(BaseCommand):
     def add_arguments(self, parser):
-        parser.add_argument('content', metavar='content', help='One of (update/import/export)')
+        parser.add_argument('content', metavar='content', help='One of (update/import/export/store)')
         parser.add_argument('label', metavar='label', help='Cache for content')
         parser.add_argument(
             '--ids', dest='ids', help='Nominates a specific database to load fixtures into. Defaults to the "default" database.',
         )
 
+    @staticmethod
+    def _chunks(query) -> Iterable[List[int]]:
+        pks = list(query.values_list('pk', flat=True))
+        for start in tqdm(range(0, len(pks), CHUNK_SIZE)):
+            yield pks[start:start + CHUNK_SIZE]
+
+    @staticmethod
+    def _labels(label: str) -> List[str]:
+        # hashes of sent polygons are rewritten with them
+        return [label, hash_cache(label)] if label in Region.HASHED else [label]
+
     def _update(self, query, label, **kwargs):
-        for region in tqdm(query.iterator(), total=query.count()):
-            cache.delete(POLYGON_CACHE_KEY.format(func=label, id=region.pk))
-            getattr(region, label)
+        # stored geometry would be served instead of recomputation
+        RegionGeometry.objects.filter(region__in=query, name=label).delete()
+        for pks in self._chunks(query):
+            invalidate_many(POLYGON_CACHE_KEY.format(func=name, id=pk) for pk in pks for name in self._labels(label))
+            Region.bulk_cache([(label, pk) for pk in pks])
 
     def _export(self, query, label, **kwargs):
         with open('geocache_{}.json'.format(label), 'w') as f:
@@ -27,12 +46,20 @@ class Command(BaseCommand):
                 result = {region.pk: getattr(region, label)}
                 f.write(json.dumps(result) + "\n")
 
+    def _store(self, query, **kwargs):
+        for pks in self._chunks(query):
+            geometry_storage.fill(pks)
+
     def _import(self, label, **kwargs):
+        imported = []
         with open('geocache_{}.json'.format(label), 'r') as f:
             while region := json.loads(f.readline()):
                 for rec in region.keys():
                     cache_key = POLYGON_CACHE_KEY.format(func=label, id=rec)
                     cache.set(cache_key, region[rec], timeout=None)
+                    imported.append(rec)
+        if label in Region.HASHED:
+            invalidate_many(POLYGON_CACHE_KEY.format(func=hash_cache(label), id=pk) for pk in imported)
 
     def handle(self, **options):
         handler = getattr(self, '_{}'.format(options['content']), None)
@@ -0,0 +1,31 @@
+# Generated by Django 2.2.24 on 2026-10-17 10:12
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maps', '0010_auto_20200405_0935'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegionGeometry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=32)),
+                ('data', django.contrib.postgres.fields.jsonb.JSONField()),
+                ('source_hash', models.CharField(max_length=32)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('region', models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE,
+                                             related_name='geometries', to='maps.Region')),
+            ],
+            options={
+                'db_table': 'maps_region_geometry',
+                'unique_together': {('region', 'name')},
+            },
+        ),
+    ]
@@ -1,3 +1,3 @@
 from .game import Game, GameTranslation
-from .region import Region, RegionInterface, RegionTranslation, RegionCache
+from .region import Region, RegionInterface, RegionTranslation, RegionCache, AsyncRegionCache, RegionGeometry
 from .tag import Tag
@@ -1,28 +1,38 @@
 from __future__ import annotations
 
+import json
 from copy import deepcopy
-from typing import List, Dict, Union, Tuple
+from typing import List, Dict, Union, Tuple, Optional, Iterable, Any, Callable
 
 from django.contrib.gis.geos import MultiPolygon, Polygon
 from django.conf import settings
 from django.contrib.gis.db.models import MultiPolygonField
 from django.contrib.postgres.fields import JSONField
-from django.core.cache import cache
-from django.db import models
-from django.db.models import QuerySet
+from django.db import models, connection
+from django.db.models import QuerySet, Func, F
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
-from common.cachable import cacheable
+from common.async_cachable import async_cached_many
+from common.cachable import cacheable, cached_many, invalidate_many, CacheItem, CacheStorage
 from common.constants import Point, LanguageEnumType
 from common.db import GinIndexTrgrm
 from common.utils import get_language
-from ..constants import OsmRegionData
+from ..constants import OsmRegionData, Zoom, hash_cache, zoom_cache, zoom_tolerance
 from ..converter import encode_geometry
+from ..dedup import geometry_hash
+from ..derived import derive_geometry
 from ..fields import ExternalIdField
+from ..prepared import prepared_regions
+
+# name of regions without a translation
+EMPTY_NAME = '(empty)'
 
 
 class RegionInterface:
+    # polygons sent to clients, the hash of each one is cached under `hash_cache`
+    HASHED = ('polygon_gmap', *(zoom_cache(zoom) for zoom in Zoom))
+
     @property  # type: ignore
     @cacheable()
     def polygon_bounds(self) -> List[float]:
@@ -48,22 +58,104 @@ class RegionInterface:
     def polygon_infobox(self) -> Dict:
         raise NotImplementedError
 
-    def full_info(self, lang: str) -> Dict:
-        return {'infobox': self.polygon_infobox[lang], 'polygon': self.polygon_gmap, 'id': self.pk}
+    def polygon_zoom(self, zoom: int) -> List[str]:
+        return getattr(self, zoom_cache(zoom))
+
+    @staticmethod
+    def localized_infobox(infoboxes: Dict[str, Dict], lang: str) -> Dict:
+        """The infobox of `polygon_infobox` in the language, an empty one for regions without the translation."""
+        if lang in infoboxes:
+            return infoboxes[lang]
+        # cached before missing translations were filled, the marker doesn't depend on the language
+        return {'name': EMPTY_NAME, 'marker': next((infobox['marker'] for infobox in infoboxes.values()), None)}
+
+    def full_info(self, lang: str, zoom: Optional[int] = None) -> Dict:
+        polygon = 'polygon_gmap' if zoom is None else zoom_cache(zoom)
+        return {'infobox': self.localized_infobox(self.polygon_infobox, lang), 'polygon': getattr(self, polygon),
+                'hash': getattr(self, hash_cache(polygon)), 'id': self.pk}
+
+    @staticmethod
+    def cache_computer() -> Callable[[str, List[int]], Dict[int, Any]]:
+        """`compute` for `cached_many` over `polygon_*` caches of regions."""
+        def compute(name: str, pks: List[int]) -> Dict[int, Any]:
+            result = {}
+            if name in GeometryStorage.NAMES:
+                # only the level of this cache is simplified
+                result = {pk: values.get(name) for pk, values in derive_geometry(pks, [name]).items()}
+            elif name in HASH_LEVELS:
+                return Region.compute_hashes(HASH_LEVELS[name], pks)
+            func = getattr(Region, name).fget.__wrapped__
+            rest = Region.objects.defer(None).filter(pk__in=[pk for pk in pks if pk not in result])
+            result.update({region.pk: func(region) for region in rest})
+            return result
+
+        return compute
+
+    @classmethod
+    def bulk_cache(cls, items: Iterable[CacheItem]) -> Dict[CacheItem, Any]:
+        """Values of `polygon_*` caches for many (name, pk) pairs in one cache round trip."""
+        return cached_many(((name, int(pk)) for name, pk in items), cls.cache_computer(), storage=geometry_storage)
+
+    @staticmethod
+    def full_info_items(pks: List[int], zoom: Optional[int] = None) -> List[CacheItem]:
+        polygon = 'polygon_gmap' if zoom is None else zoom_cache(zoom)
+        return [(name, pk) for pk in pks for name in (polygon, 'polygon_infobox', hash_cache(polygon))]
+
+    @classmethod
+    def bulk_full_info(cls, pks: Iterable[int], lang: str, zoom: Optional[int] = None) -> List[Dict]:
+        pks = [int(pk) for pk in pks]
+        return cls.build_full_info(cls.bulk_cache(cls.full_info_items(pks, zoom)), pks, lang, zoom)
+
+    @staticmethod
+    def build_full_info(data: Dict[CacheItem, Any], pks: List[int], lang: str,
+                        zoom: Optional[int] = None) -> List[Dict]:
+        polygon = 'polygon_gmap' if zoom is None else zoom_cache(zoom)
+        return [{'infobox': RegionInterface.localized_infobox(data[('polygon_infobox', pk)], lang), 'id': pk,
+                 'polygon': data[(polygon, pk)], 'hash': data[(hash_cache(polygon), pk)]} for pk in pks]
+
+
+def zoom_property(zoom: Zoom, func: Callable[[Any, Zoom], List[str]], storage: Optional[CacheStorage] = None):
+    """Cached property with the polygon for the zoom, named by `zoom_cache`."""
+    def level(self) -> List[str]:
+        return func(self, zoom)
+    level.__name__ = zoom_cache(zoom)
+    return property(cacheable(storage=storage)(level))
+
+
+def hash_property(polygon: str, func: Callable[[Any, str], str]):
+    """Cached property with the hash of the polygon cache, named by `hash_cache`."""
+    def polygon_hash(self) -> str:
+        return func(self, polygon)
+    polygon_hash.__name__ = hash_cache(polygon)
+    return property(cacheable()(polygon_hash))
+
+
+def _not_implemented(region, level: Any) -> Any:
+    raise NotImplementedError
+
+
+for _zoom in Zoom:
+    setattr(RegionInterface, zoom_cache(_zoom), zoom_property(_zoom, _not_implemented))
+
+# polygon cache by the name of its hash cache
+HASH_LEVELS = {hash_cache(name): name for name in RegionInterface.HASHED}
+
+for _name in RegionInterface.HASHED:
+    setattr(RegionInterface, hash_cache(_name), hash_property(_name, _not_implemented))
 
 
 class RegionCacheMeta(type):
     def __new__(cls, name, bases, dct):
         new = type.__new__(cls, name, bases, dct)
-        for method_name, _ in bases[0].__dict__.items():
-            if method_name.startswith('polygon_'):
-                setattr(new, method_name, property(cacheable()(new.wrapper(method_name))))
+        for method_name, method in bases[0].__dict__.items():
+            if method_name.startswith('polygon_') and isinstance(method, property):
+                setattr(new, method_name, property(new.wrapper(method_name)))
         return new
 
     def wrapper(cls, name: str):
+        # the same cache keys as Region properties, so it must not wrap them with another lock
         def wrapper(region_cache, *args, **kwargs):
-            origin = Region.objects.get(pk=region_cache.pk)
-            return getattr(origin, name)
+            return Region.bulk_cache([(name, region_cache.pk)])[(name, int(region_cache.pk))]
         wrapper.__name__ = name
         return wrapper
 
@@ -74,6 +166,101 @@ class RegionCache(RegionInterface, metaclass=RegionCacheMeta):  # pylint: disabl
         self.pk = pk
 
 
+class AsyncRegionCacheMeta(RegionCacheMeta):
+    def wrapper(cls, name: str):
+        def wrapper(region_cache, *args, **kwargs):
+            if name not in region_cache.values:
+                raise LookupError(f'{name} of region {region_cache.pk} is not loaded')
+            return region_cache.values[name]
+        wrapper.__name__ = name
+        return wrapper
+
+
+class AsyncRegionCache(RegionInterface, metaclass=AsyncRegionCacheMeta):  # pylint: disable=abstract-method
+    """RegionCache for async code, the values are loaded on the event loop by `load` and then read as usual."""
+
+    def __init__(self, pk: int, values: Dict[str, Any]):
+        super().__init__()
+        self.pk = int(pk)
+        self.values = values
+
+    @classmethod
+    async def async_bulk_cache(cls, items: Iterable[CacheItem]) -> Dict[CacheItem, Any]:
+        return await async_cached_many(((name, int(pk)) for name, pk in items), cls.cache_computer(),
+                                       storage=geometry_storage)
+
+    @classmethod
+    async def load(cls, pk: int, names: Iterable[str]) -> AsyncRegionCache:
+        data = await cls.async_bulk_cache((name, pk) for name in names)
+        return cls(pk, {name: value for (name, _), value in data.items()})
+
+    @classmethod
+    async def async_bulk_full_info(cls, pks: Iterable[int], lang: str, zoom: Optional[int] = None) -> List[Dict]:
+        pks = [int(pk) for pk in pks]
+        return cls.build_full_info(await cls.async_bulk_cache(cls.full_info_items(pks, zoom)), pks, lang, zoom)
+
+
+class GeometryStorage(CacheStorage):
+    """Keeps derived geometry in RegionGeometry, so cold Redis doesn't lead to GEOS recomputation."""
+
+    NAMES = ('polygon_bounds', 'polygon_strip', 'polygon_gmap', 'polygon_center', *(zoom_cache(zoom) for zoom in Zoom))
+
+    # rows are inserted or replaced in one statement, so concurrent saves of the same geometry don't conflict
+    UPSERT_SQL = """INSERT INTO maps_region_geometry (region_id, name, data, source_hash, modified)
+SELECT region_id, name, data, source_hash, now()
+FROM unnest(%(regions)s::int[], %(names)s::text[], %(data)s::jsonb[], %(hashes)s::text[])
+    AS item(region_id, name, data, source_hash)
+ON CONFLICT (region_id, name) DO UPDATE
+SET data = EXCLUDED.data, source_hash = EXCLUDED.source_hash, modified = EXCLUDED.modified"""
+
+    @staticmethod
+    def source_hash(field: str) -> Func:
+        return Func(F(field), template='md5(ST_AsBinary(%(expressions)s))', output_field=models.CharField())
+
+    @classmethod
+    def source_hashes(cls, pks: Iterable[int]) -> Dict[int, str]:
+        return dict(Region.objects.filter(pk__in=pks).annotate(source=cls.source_hash('polygon'))
+                    .values_list('pk', 'source'))
+
+    def load(self, items: List[CacheItem]) -> Dict[CacheItem, Any]:
+        wanted = {item for item in items if item[0] in self.NAMES}
+        if not wanted:
+            return {}
+        # rows of an older polygon are skipped, the value is computed again
+        rows = (RegionGeometry.objects
+                .filter(region_id__in={pk for _, pk in wanted}, name__in={name for name, _ in wanted})
+                .annotate(current=self.source_hash('region__polygon')).filter(source_hash=F('current')))
+        return {(row.name, row.region_id): row.data for row in rows if (row.name, row.region_id) in wanted}
+
+    def save(self, values: Dict[CacheItem, Any]) -> None:
+        values = {item: value for item, value in values.items() if item[0] in self.NAMES}
+        if not values:
+            return
+        hashes = self.source_hashes({pk for _, pk in values})
+        rows = [(pk, name, json.dumps(value), hashes[pk]) for (name, pk), value in values.items() if pk in hashes]
+        if not rows:
+            return
+        regions, names, data, source_hashes = zip(*rows)
+        with connection.cursor() as cursor:
+            cursor.execute(self.UPSERT_SQL, {'regions': list(regions), 'names': list(names), 'data': list(data),
+                                             'hashes': list(source_hashes)})
+
+    def fill(self, pks: Iterable[int]) -> None:
+        """Computes derived geometry of the regions unless it is stored for the same source."""
+        hashes = self.source_hashes(pks)
+        stored: Dict[int, set] = {}
+        for pk, name, source_hash in RegionGeometry.objects.filter(region_id__in=hashes.keys()).values_list(
+                'region_id', 'name', 'source_hash'):
+            stored.setdefault(pk, set()).add((name, source_hash))
+        outdated = [pk for pk, current in hashes.items()
+                    if not {(name, current) for name in self.NAMES} <= stored.get(pk, set())]
+        self.save({(name, pk): values.get(name)
+                   for pk, values in derive_geometry(outdated, self.NAMES).items() for name in self.NAMES})
+
+
+geometry_storage = GeometryStorage()
+
+
 class RegionManager(models.Manager):
     def get_queryset(self) -> QuerySet[Region]:
         return super().get_queryset().defer('polygon')
@@ -91,6 +278,9 @@ class Region(RegionInterface, models.Model):
 
     objects = RegionManager()
 
+    # responses of views by region stored with their encodings, see `payload_key`
+    PAYLOADS = ('region', 'region_binary', 'infobox')
+
     class Meta:
         verbose_name = 'Region'
         verbose_name_plural = 'Regions'
@@ -99,7 +289,7 @@ class Region(RegionInterface, models.Model):
         return f'{self.title} ({self.pk})'
 
     @property  # type: ignore
-    @cacheable()
+    @cacheable(storage=geometry_storage)
     def polygon_bounds(self) -> List[float]:
         return self.polygon.extent
 
@@ -109,20 +299,28 @@ class Region(RegionInterface, models.Model):
         return self.polygon.simplify(precision, preserve_topology=True)
 
     @property  # type: ignore
-    @cacheable()
+    @cacheable(storage=geometry_storage)
     def polygon_strip(self) -> List[str]:
         simplify = self._strip_polygon
         return encode_geometry(simplify, min_points=10)
 
     @property  # type: ignore
-    @cacheable()
+    @cacheable(storage=geometry_storage)
     def polygon_gmap(self) -> List[str]:
         precision = 0.005 + 0.001 * (self.polygon.area / 100.0)
         simplify = self.polygon.simplify(precision, preserve_topology=True)
         return encode_geometry(simplify)
 
+    def zoom_polygon(self, zoom: Zoom) -> List[str]:
+        """Encoded polygon simplified to about one pixel on the zoom, see `polygon_zoom`.
+
+        Parts which are smaller than a couple of pixels are dropped."""
+        tolerance = zoom_tolerance(zoom)
+        simplify = self.polygon.simplify(tolerance, preserve_topology=True)
+        return encode_geometry(simplify, min_area=(2 * tolerance) ** 2)
+
     @property  # type: ignore
-    @cacheable()
+    @cacheable(storage=geometry_storage)
     def polygon_center(self) -> List[float]:
         # http://lists.osgeo.org/pipermail/postgis-users/2007-February/014612.html
         def calc_polygon(strip, force) -> Tuple[Point, int]:
@@ -174,8 +372,20 @@ class Region(RegionInterface, models.Model):
                 infobox['capital'] = {k: v for k, v in infobox['capital'].items() if k != 'id'}
             infobox['marker'] = get_marker(infobox)
             result[trans.language_code] = infobox
+        for lang in settings.ALLOWED_LANGUAGES:
+            if lang not in result:  # nothing is created on the read path, see `RegionForm.translation`
+                result[lang] = {'name': EMPTY_NAME, 'marker': get_marker({})}
         return result
 
+    def level_hash(self, polygon: str) -> str:
+        """`geometry_hash` of the polygon cache, so messages don't hash it again."""
+        return self.compute_hashes(polygon, [self.pk])[self.pk]
+
+    @classmethod
+    def compute_hashes(cls, polygon: str, pks: List[int]) -> Dict[int, str]:
+        data = cls.bulk_cache((polygon, pk) for pk in pks)
+        return {pk: geometry_hash(value) for (_, pk), value in data.items()}
+
     @classmethod
     def caches(cls) -> List[str]:
         result = []
@@ -185,6 +395,11 @@ class Region(RegionInterface, models.Model):
                 result.append(name)
         return result
 
+    @staticmethod
+    def payload_key(name: str, lang: str, pk: int) -> str:
+        """Key of a response by the region stored with its encodings, see `common.compressed`."""
+        return settings.POLYGON_CACHE_KEY.format(func=f'payload_{name}_{lang}', id=int(pk))
+
     @property
     def osm_data(self) -> OsmRegionData:
         return OsmRegionData(**self._osm_data)
@@ -200,10 +415,29 @@ class Region(RegionInterface, models.Model):
     def load_translation(self, lang: LanguageEnumType) -> RegionTranslation:
         result = self.translations.filter(language_code=lang).first()
         if result is None:
-            result = RegionTranslation.objects.create(language_code=lang, master=self, name='(empty)')
+            result = RegionTranslation.objects.create(language_code=lang, master=self, name=EMPTY_NAME)
         return result
 
 
+for _zoom in Zoom:
+    setattr(Region, zoom_cache(_zoom), zoom_property(_zoom, Region.zoom_polygon, geometry_storage))
+
+for _name in Region.HASHED:
+    setattr(Region, hash_cache(_name), hash_property(_name, Region.level_hash))
+
+
+class RegionGeometry(models.Model):
+    region = models.ForeignKey(Region, on_delete=models.CASCADE, related_name='geometries', editable=False)
+    name = models.CharField(max_length=32)
+    data = JSONField()
+    source_hash = models.CharField(max_length=32)
+    modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('region', 'name')
+        db_table = 'maps_region_geometry'
+
+
 class RegionTranslation(models.Model):
     name = models.CharField(max_length=120)
     infobox = JSONField(default=dict)
@@ -218,5 +452,9 @@ class RegionTranslation(models.Model):
 
 @receiver(post_save, sender=Region, dispatch_uid="clear_region_cache")
 def clear_region_cache(sender, instance: Region, **kwargs):  # pylint: disable=unused-argument
-    for key in instance.caches():
-        cache.delete(settings.POLYGON_CACHE_KEY.format(func=key, id=instance.pk))
+    # stored geometry of the old polygon isn't served, it's derived again on a miss or by `cache store`
+    prepared_regions.discard(instance.pk)
+    invalidate_many(settings.POLYGON_CACHE_KEY.format(func=key, id=instance.pk) for key in instance.caches())
+    # payloads are rebuilt from the caches above, a stale copy isn't worth compressing again
+    invalidate_many((Region.payload_key(name, lang, instance.pk)
+                     for name in Region.PAYLOADS for lang in settings.ALLOWED_LANGUAGES), keep_stale=False)
@@ -0,0 +1,88 @@
+"""Prepared polygons of regions for point-in-polygon checks without the database.
+
+Containment is tested on the plane, while PostGIS tests geography on the
+sphere, so answers may differ for points a few metres from long edges.
+"""
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.gis.geos import GEOSGeometry
+from django.contrib.gis.geos.prepared import PreparedGeometry
+
+from common.cachable import local_cache
+
+
+class SharedPrepared:
+    """Prepared geometry used by many threads.
+
+    GEOS prepared geometries build their index lazily and are not thread safe,
+    so every predicate runs under the lock of the entry.
+    """
+
+    def __init__(self, prepared: PreparedGeometry):
+        self._prepared = prepared
+        self._lock = threading.Lock()
+
+    def covers(self, other: GEOSGeometry) -> bool:
+        with self._lock:
+            return self._prepared.covers(other)
+
+
+class PreparedRegions:
+    """LRU of prepared region polygons limited by the total amount of vertices.
+
+    A region is dropped together with its `polygon_bounds` in the local cache,
+    which happens in every process on `common.cachable.invalidate`.
+    """
+
+    def __init__(self, max_points: int):
+        self.max_points = max_points
+        self._items: OrderedDict[int, Tuple[SharedPrepared, int]] = OrderedDict()
+        self._points = 0
+        self._lock = threading.Lock()
+        local_cache.listen(self._invalidated)
+
+    def _invalidated(self, keys: Optional[List[str]]) -> None:
+        with self._lock:
+            if keys is None:
+                self._items.clear()
+                self._points = 0
+                return
+            keys = set(keys)
+            dropped = [pk for pk in self._items
+                       if settings.POLYGON_CACHE_KEY.format(func='polygon_bounds', id=pk) in keys]
+            for pk in dropped:
+                self._pop(pk)
+
+    def get(self, pk: int) -> Optional[SharedPrepared]:
+        with self._lock:
+            item = self._items.get(int(pk))
+            if item is None:
+                return None
+            self._items.move_to_end(int(pk))
+            return item[0]
+
+    def add(self, pk: int, polygon: GEOSGeometry) -> None:
+        points = polygon.num_points
+        if points > self.max_points:
+            return
+        with self._lock:
+            self._pop(int(pk))
+            self._items[int(pk)] = (SharedPrepared(polygon.prepared), points)
+            self._points += points
+            while self._points > self.max_points:
+                self._pop(next(iter(self._items)))
+
+    def _pop(self, pk: int) -> None:
+        item = self._items.pop(pk, None)
+        if item is not None:
+            self._points -= item[1]
+
+    def discard(self, pk: int) -> None:
+        with self._lock:
+            self._pop(int(pk))
+
+
+prepared_regions = PreparedRegions(settings.POLYGON_PREPARED_POINTS)
@@ -0,0 +1,35 @@
+"""Assembled question sets of games for `QuestionView`.
+
+A set is cached by game and parameters of the form under the version of the
+game. The version is increased when the game, its regions or their
+translations change, so old sets are never read again and just expire. Only
+the order of questions and default positions are made per request, see
+`RegionForm.personalize`.
+"""
+from typing import Callable, Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+
+from common.cachable import cached_value
+from common.constants import GameQuestions
+from .models import Game
+
+QUESTIONS_KEY = 'questions_{category}_{pk}_{version}_{variant}'
+VERSION_KEY = 'questions_version_{category}_{pk}'
+
+
+def cached_questions(game: Game, variant: str, build: Callable[[], GameQuestions]) -> GameQuestions:
+    """The set is shared between requests, so it must not be changed."""
+    version = cache.get(VERSION_KEY.format(category=game.category, pk=game.pk), 0)
+    key = QUESTIONS_KEY.format(category=game.category, pk=game.pk, version=version, variant=variant)
+    return cached_value(key, build, settings.QUESTIONS_CACHE_TTL)
+
+
+def invalidate_questions(category: str, pks: Iterable[int]) -> None:
+    for pk in pks:
+        key = VERSION_KEY.format(category=category, pk=pk)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
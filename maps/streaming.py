@@ -0,0 +1,46 @@
+"""Question sets written to the response while they are built, see `QuestionView`.
+
+Forms return sections of the payload as lazy iterators of items. Geometry is
+read from caches by chunks of QUESTIONS_STREAM_CHUNK regions, so a worker
+holds one chunk at a time instead of the whole set.
+"""
+import json
+from typing import Any, Iterable, Iterator, List, Tuple, TypeVar, Union
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+# items of a list or a single number, e.g. the game of a topology
+Section = Tuple[str, Union[int, Iterable[Any]]]
+T = TypeVar('T')
+
+# bytes collected before they are given to the server
+BUFFER_SIZE = 64 * 1024
+
+
+def chunked(items: List[T], size: int = 0) -> Iterator[List[T]]:
+    size = size or settings.QUESTIONS_STREAM_CHUNK
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def stream_json(sections: Iterable[Section]) -> Iterator[bytes]:
+    """The same JSON object as `{name: list(items)}` of the sections, by parts, numbers are written as is."""
+    encoder = DjangoJSONEncoder()
+    buffer: List[str] = ['{']
+    size = 0
+    for index, (name, items) in enumerate(sections):
+        if isinstance(items, int):
+            buffer.append(f'{", " if index else ""}{json.dumps(name)}: {items}')
+            continue
+        buffer.append(f'{", " if index else ""}{json.dumps(name)}: [')
+        for position, item in enumerate(items):
+            text = encoder.encode(item)
+            buffer.append(f', {text}' if position else text)
+            size += len(text)
+            if size >= BUFFER_SIZE:
+                yield ''.join(buffer).encode()
+                buffer, size = [], 0
+        buffer.append(']')
+    buffer.append('}')
+    yield ''.join(buffer).encode()
@@ -0,0 +1,18 @@
+from unittest import TestCase
+
+from maps.binary import pack_questions, pack_geometry, unpack, unpack_geometry
+from .test_decoder import FULL_ENCODE
+
+
+class BinaryTestCase(TestCase):
+    def test_geometry(self):
+        packed = pack_geometry(FULL_ENCODE)
+        self.assertLess(len(packed), sum(len(ring) for ring in FULL_ENCODE))
+        self.assertEqual(unpack_geometry(packed), FULL_ENCODE)
+
+    def test_questions(self):
+        payload = {'questions': [{'id': 1, 'polygon': FULL_ENCODE}], 'solved': [{'id': 2, 'polygon': FULL_ENCODE[1:]}]}
+        header, geometries = unpack(pack_questions(payload))
+        self.assertEqual(header['questions'][0]['id'], 1)
+        self.assertEqual(geometries[header['questions'][0]['polygon']], FULL_ENCODE)
+        self.assertEqual(geometries[header['solved'][0]['polygon']], FULL_ENCODE[1:])
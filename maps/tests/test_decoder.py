@@ -2,9 +2,11 @@ import json
 from typing import List
 from unittest import TestCase
 
+import numpy
 from django.contrib.gis.geos import MultiPolygon, Polygon
 
-from maps.converter import encode_geometry, decode, Point
+from maps.converter import encode_geometry, encode_geojson, encode_wkb, encode_coords, encode_array, decode, Point
+from maps.factories import POINTS
 
 POLYGON_JSON = """[
     [[-2.4610019,49.4612907],[-2.4610233,49.4613325],[-2.4628043,49.4608862],[-2.4634051,49.4606073],[-2.4640274,49.4606491],[-2.4642205,49.4599378],[-2.4651432,49.4597984],[-2.4651861,49.4587523],[-2.4658513,49.4584455],[-2.4653149,49.4574273],[-2.4653149,49.4564509],[-2.4643064,49.4562138],[-2.4639845,49.4557954],[-2.4626756,49.4559349],[-2.462461,49.4563533],[-2.4618816,49.4569531],[-2.4607658,49.456967],[-2.46068,49.4574691],[-2.4605298,49.4577063],[-2.46068,49.4578178],[-2.460444,49.4580828],[-2.4600363,49.4579434],[-2.4595642,49.4580828],[-2.4595213,49.4583339],[-2.4594784,49.458836],[-2.4592209,49.4590452],[-2.4592209,49.4593242],[-2.4590921,49.4595055],[-2.4593067,49.4597147],[-2.4596715,49.4599239],[-2.45965,49.4602168],[-2.4598861,49.4603981],[-2.4602509,49.4604678],[-2.4603367,49.460677],[-2.4608088,49.4609002],[-2.4610019,49.4612907]],
@@ -42,3 +44,15 @@ class DecoderTestCase(TestCase):
         for i, point in enumerate(decode(FULL_ENCODE[1])):
             self.assertLess(abs(self.points[1][i][0] - point[0]), 0.00001)
             self.assertLess(abs(self.points[1][i][1] - point[1]), 0.00001)
+
+    def test_encode_array(self):
+        for points in (*self.points, *POINTS):
+            self.assertEqual(encode_coords(points), encode_array(numpy.array(points)))
+        self.assertEqual(encode_array(numpy.empty((0, 2))), '')
+
+    def test_encode_wkb(self):
+        polygon = MultiPolygon(self.islands, srid=4326)
+        self.assertEqual(FULL_ENCODE, encode_wkb(polygon.wkb))
+        self.assertEqual(FULL_ENCODE, encode_wkb(polygon.ewkb))
+        self.assertEqual(FULL_ENCODE, encode_geojson(polygon))
+        self.assertEqual([FULL_ENCODE[0], FULL_ENCODE[2]], encode_geojson(polygon, min_points=20))
@@ -0,0 +1,29 @@
+from unittest import TestCase
+
+from maps.dedup import HASH_LENGTH, geometry_hash, parse_known, strip_known
+
+
+class DedupTestCase(TestCase):
+    def test_strip_known(self):
+        first, second = ['abc', 'def'], ['ghi']
+        known = {geometry_hash(first)}
+        items = [{'id': 1, 'polygon': list(first)}, {'id': 2, 'polygon': list(second)},
+                 {'id': 3, 'polygon': [[1, -2]]}]
+
+        hashes = strip_known(items, known)
+
+        self.assertEqual(hashes, {geometry_hash(first), geometry_hash(second)})
+        self.assertIsNone(items[0]['polygon'])
+        self.assertEqual(items[1]['polygon'], second)
+        self.assertEqual(items[1]['hash'], geometry_hash(second))
+        self.assertNotIn('hash', items[2])
+
+    def test_cached_hash(self):
+        items = [{'id': 1, 'polygon': ['abc'], 'hash': 'cached'}]
+        self.assertEqual(strip_known(items, {'cached'}), {'cached'})
+        self.assertIsNone(items[0]['polygon'])
+
+    def test_parse_known(self):
+        value = geometry_hash(['abc'])
+        self.assertEqual(len(value), HASH_LENGTH)
+        self.assertEqual(parse_known(f'{value},,short'), {value})
@@ -1,9 +1,21 @@
+import asyncio
+import gzip
+import json
 from copy import deepcopy
 
+from django.conf import settings
+from django.core.cache import cache
 from django.test import TestCase as DjangoTestCase
 from django.urls import reverse
 
-from maps.models import Region
+from maps.binary import unpack
+from maps.constants import Zoom, hash_cache, zoom_cache
+from maps.converter import decode
+from maps.dedup import geometry_hash
+from maps.derived import derive_geometry
+from common.cachable import local_cache
+from maps.models import Region, RegionGeometry, AsyncRegionCache
+from maps.models.region import geometry_storage
 from maps.factories import RegionFactory, INFOBOX, multipolygon_factory
 
 
@@ -25,4 +37,91 @@ class RegionTestCase(DjangoTestCase):
         content = response.json()
         self.assertEqual(content['id'], self.region.pk)
         self.assertEqual(len(content['polygon']), 2)  # 2 islands
+        self.assertEqual(content['hash'], geometry_hash(content['polygon']))
         self.assertDictEqual(content['infobox'], infobox)
+
+    def test_pyramid(self):
+        pyramid = {zoom.name: self.region.polygon_zoom(zoom) for zoom in Zoom}
+        for zoom in Zoom:
+            self.assertGreater(len(pyramid[zoom.name]), 0)
+        self.assertEqual(self.region.full_info('en', Zoom.REGION)['polygon'], pyramid['REGION'])
+        self.assertLessEqual(sum(len(x) for x in pyramid['WORLD']), sum(len(x) for x in pyramid['REGION']))
+
+    def test_level_hash(self):
+        keys = {zoom: settings.POLYGON_CACHE_KEY.format(func=zoom_cache(zoom), id=self.region.pk) for zoom in Zoom}
+        cache.delete_many(list(keys.values()))
+        name = hash_cache(zoom_cache(Zoom.REGION))
+        data = Region.bulk_cache([(name, self.region.pk)])
+        self.assertEqual(data[(name, self.region.pk)], geometry_hash(self.region.polygon_zoom(Zoom.REGION)))
+        self.assertIsNone(cache.get(keys[Zoom.WORLD]))  # other levels aren't hashed
+
+    def test_binary(self):
+        response = self.client.get(reverse('region', args=(self.region.pk,)), {'format': 'binary'})
+        self.assertEqual(response.status_code, 200)
+        header, geometries = unpack(response.content)
+        self.assertEqual(header['id'], self.region.pk)
+        self.assertEqual(geometries[header['polygon']], self.region.polygon_gmap)
+
+    def test_compressed(self):
+        url = reverse('region', args=(self.region.pk,))
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(response.content))['id'], self.region.pk)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.json()['id'], self.region.pk)
+
+    def test_bulk_full_info(self):
+        second = RegionFactory(polygon=multipolygon_factory())
+        pks = [self.region.pk, second.pk]
+        expected = [Region.objects.get(pk=pk).full_info('en', Zoom.COUNTRY) for pk in reversed(pks)]
+        self.assertEqual(Region.bulk_full_info(reversed(pks), 'en', Zoom.COUNTRY), expected)
+        Region.bulk_full_info(pks, 'ru')
+        with self.assertNumQueries(0):
+            self.assertEqual(len(Region.bulk_full_info(pks, 'ru')), 2)
+
+    def test_geometry_storage(self):
+        self.assertFalse(RegionGeometry.objects.filter(region=self.region).exists())  # saving doesn't derive
+        geometry_storage.fill([self.region.pk])
+        stored = dict(RegionGeometry.objects.filter(region=self.region).values_list('name', 'data'))
+        self.assertSetEqual(set(stored.keys()), set(geometry_storage.NAMES))
+        cache.clear()
+        local_cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.region.polygon_gmap, stored['polygon_gmap'])
+
+        RegionGeometry.objects.filter(region=self.region).update(source_hash='outdated')
+        self.assertDictEqual(geometry_storage.load([('polygon_gmap', self.region.pk)]), {})
+        geometry_storage.save({('polygon_gmap', self.region.pk): stored['polygon_gmap']})
+        self.assertDictEqual(geometry_storage.load([('polygon_gmap', self.region.pk)]),
+                             {('polygon_gmap', self.region.pk): stored['polygon_gmap']})
+
+    def test_derive_geometry(self):
+        region = Region.objects.defer(None).get(pk=self.region.pk)
+        derived = derive_geometry([region.pk])[region.pk]
+        self.assertListEqual(derived['polygon_bounds'], list(region.polygon.extent))
+        for name in ('polygon_strip', 'polygon_gmap'):
+            expected = getattr(Region, name).fget.__wrapped__(region)
+            self.assertEqual(len(derived[name]), len(expected))
+            for ring, expected_ring in zip(derived[name], expected):
+                for point, expected_point in zip(decode(ring), decode(expected_ring)):
+                    self.assertAlmostEqual(point[0], expected_point[0], delta=1e-5)
+                    self.assertAlmostEqual(point[1], expected_point[1], delta=1e-5)
+        self.assertTrue({zoom_cache(zoom) for zoom in Zoom} <= set(derived.keys()))
+        for value, expected in zip(derived['polygon_center'], Region.polygon_center.fget.__wrapped__(region)):
+            self.assertAlmostEqual(value, expected, places=6)
+        center = derive_geometry([region.pk], ['polygon_center'])[region.pk]
+        self.assertDictEqual(center, {'polygon_center': derived['polygon_center']})
+
+    def test_async_region_cache(self):
+        names = ('polygon_bounds', 'polygon_gmap', 'polygon_infobox', hash_cache('polygon_gmap'))
+        expected = Region.bulk_cache((name, self.region.pk) for name in names)
+        local_cache.clear()  # values are read from Redis by the async client
+        with self.assertNumQueries(0):
+            region = asyncio.run(AsyncRegionCache.load(self.region.pk, names))
+        self.assertEqual(region.polygon_bounds, expected[('polygon_bounds', self.region.pk)])
+        self.assertEqual(region.full_info('en'), self.region.full_info('en'))
+        with self.assertRaises(LookupError):
+            region.polygon_strip  # pylint: disable=pointless-statement
@@ -0,0 +1,23 @@
+import json
+from unittest import TestCase
+
+from maps import streaming
+from maps.streaming import chunked, stream_json
+
+
+class StreamingTestCase(TestCase):
+    def test_stream_json(self):
+        questions = [{'id': pk, 'name': f'region {pk}'} for pk in range(100)]
+        sections = [('questions', iter(questions)), ('solved', iter([])), ('game', 1), ('arcs', ['a', 'b'])]
+        default_size = streaming.BUFFER_SIZE
+        streaming.BUFFER_SIZE = 100
+        try:
+            parts = list(stream_json(sections))
+        finally:
+            streaming.BUFFER_SIZE = default_size
+        self.assertGreater(len(parts), 1)
+        self.assertDictEqual(json.loads(b''.join(parts)),
+                             {'questions': questions, 'solved': [], 'game': 1, 'arcs': ['a', 'b']})
+
+    def test_chunked(self):
+        self.assertListEqual(list(chunked([1, 2, 3, 4, 5], 2)), [[1, 2], [3, 4], [5]])
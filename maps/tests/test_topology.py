@@ -0,0 +1,45 @@
+from typing import List
+from unittest import TestCase
+
+from django.contrib.gis.geos import MultiPolygon, Polygon
+
+from maps.converter import decode, encode_geometry, Point
+from maps.topology import build_topology, topology_from_polylines, Topology
+
+LEFT = Polygon(((1.0, 1.0), (1.5, 1.0), (1.5, 1.5), (1.0, 1.5), (1.0, 1.0)))
+RIGHT = Polygon(((1.5, 1.0), (2.0, 1.0), (2.0, 1.5), (1.5, 1.5), (1.5, 1.0)))
+ISLAND = Polygon(((3.0, 3.0), (3.5, 3.0), (3.5, 3.5), (3.0, 3.0)))
+
+
+def decode_ring(topology: Topology, ring: List[int]) -> List[Point]:
+    result: List[Point] = []
+    for index in ring:
+        points = decode(topology['arcs'][~index if index < 0 else index])
+        if index < 0:
+            points = points[::-1]
+        result += points if not result else points[1:]
+    return result
+
+
+class TopologyTestCase(TestCase):
+    def test_shared_border(self):
+        topology = build_topology({1: MultiPolygon(LEFT), 2: MultiPolygon(RIGHT), 3: ISLAND}, tolerance=0.001)
+        self.assertEqual(len(topology['arcs']), 4)  # shared border, two outer borders and the island
+        shared = set(topology['regions'][1][0]) & {~index for index in topology['regions'][2][0]}
+        self.assertEqual(len(shared), 1)
+        self.assertEqual(len(topology['regions'][3][0]), 1)
+
+    def test_rings(self):
+        topology = build_topology({1: LEFT, 2: RIGHT}, tolerance=0.001)
+        for pk, polygon in ((1, LEFT), (2, RIGHT)):
+            ring = decode_ring(topology, topology['regions'][pk][0])
+            self.assertEqual(ring[0], ring[-1])
+            self.assertSetEqual(set(ring), set(polygon.coords[0]))
+
+    def test_polylines(self):
+        polylines = {1: encode_geometry(LEFT), 2: encode_geometry(RIGHT)}
+        topology = topology_from_polylines(polylines, tolerance=0.001)
+        self.assertEqual(len(topology['arcs']), 3)  # shared border and two outer borders
+        for pk, polygon in ((1, LEFT), (2, RIGHT)):
+            ring = decode_ring(topology, topology['regions'][pk][0])
+            self.assertSetEqual(set(ring), set(polygon.coords[0]))
@@ -0,0 +1,130 @@
+"""Shared-border (TopoJSON-like) encoding for a set of regions.
+
+Every ring is cut into arcs at the points where the set of rings sharing the
+border changes. Equal arcs are stored and simplified only once, so neighbours
+get exactly the same border. A ring is a list of arc indexes, ``~index`` means
+that the arc is used in the reverse direction. Arcs are Google-encoded polylines
+and consecutive arcs of a ring share their end points.
+
+Puzzles build their topology from the stored polylines of the game zoom (see
+`topology_from_polylines`), so the full polygons aren't loaded.
+"""
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple, TypedDict, Union, Iterable, FrozenSet
+
+import numpy
+from django.contrib.gis.geos import LineString, MultiPolygon, Polygon
+
+from .converter import encode_quantized, polyline_values, read_wkb
+
+QuantizedPoint = Tuple[int, int]
+QuantizedRing = List[QuantizedPoint]
+ArcRing = List[int]
+
+
+class Topology(TypedDict):
+    arcs: List[str]
+    regions: Dict[int, List[ArcRing]]
+
+
+def _ring(values: numpy.ndarray) -> Optional[QuantizedRing]:
+    """Open ring without repeated points, None if it has less than 3 of them."""
+    if len(values) == 0:
+        return None
+    keep = numpy.ones(len(values), dtype=bool)
+    keep[1:] = (values[1:] != values[:-1]).any(axis=1)
+    points = [(x, y) for x, y in values[keep].tolist()]
+    if points[0] == points[-1]:
+        points.pop()
+    return points if len(points) >= 3 else None
+
+
+def _rings(polygon: Union[Polygon, MultiPolygon]) -> Iterable[QuantizedRing]:
+    _, parts = read_wkb(polygon.wkb)
+    for rings in parts:
+        for ring in rings[:2]:  # exterior and the first hole, the same as encode_geometry
+            points = _ring(numpy.trunc(ring * 1e5).astype(numpy.int64))
+            if points is not None:
+                yield points
+
+
+def _polyline_rings(lines: List[str]) -> Iterable[QuantizedRing]:
+    for line in lines:
+        values = polyline_values(line)
+        deltas = numpy.where(values & 1, ~(values >> 1), values >> 1)
+        # polylines are (latitude, longitude), rings are (x, y) as in the polygons
+        points = _ring(numpy.cumsum(deltas.reshape(-1, 2), axis=0)[:, ::-1])
+        if points is not None:
+            yield points
+
+
+class TopologyBuilder:
+    def __init__(self, tolerance: float):
+        self.tolerance = tolerance * 1e5  # the same units as quantized points
+        self.arcs: List[str] = []
+        self._index: Dict[Tuple[QuantizedPoint, ...], int] = {}
+
+    def _simplify(self, points: Tuple[QuantizedPoint, ...]) -> numpy.ndarray:
+        # Douglas-Peucker keeps the end points and only drops vertices, so integers stay integers
+        simplified = LineString(points).simplify(self.tolerance, preserve_topology=False)
+        result = numpy.array(simplified.coords, dtype=numpy.int64)
+        if points[0] == points[-1] and len(result) < 4:
+            result = numpy.array(points, dtype=numpy.int64)
+        return result
+
+    def arc(self, points: Tuple[QuantizedPoint, ...]) -> int:
+        if points in self._index:
+            return self._index[points]
+        reverse = points[::-1]
+        if reverse in self._index:
+            return ~self._index[reverse]
+        index = len(self.arcs)
+        self._index[points] = index
+        self.arcs.append(encode_quantized(self._simplify(points)[:, ::-1]))
+        return index
+
+
+def _cut(ring: QuantizedRing, owners: Dict[QuantizedPoint, FrozenSet[int]]) -> List[Tuple[QuantizedPoint, ...]]:
+    size = len(ring)
+    edges = [owners[ring[i]] & owners[ring[(i + 1) % size]] for i in range(size)]
+    breaks = [i for i in range(size) if edges[i - 1] != edges[i]]
+    if not breaks:
+        # closed arc: start from the smallest point to find it from the both sides
+        start = ring.index(min(ring))
+        rotated = ring[start:] + ring[:start]
+        return [tuple(rotated + rotated[:1])]
+
+    result = []
+    for i, start in enumerate(breaks):
+        stop = breaks[(i + 1) % len(breaks)]
+        if stop <= start:
+            stop += size
+        result.append(tuple(ring[j % size] for j in range(start, stop + 1)))
+    return result
+
+
+def build_topology(polygons: Dict[int, Union[Polygon, MultiPolygon]], tolerance: float) -> Topology:
+    return _build({pk: list(_rings(polygon)) for pk, polygon in polygons.items()}, tolerance)
+
+
+def topology_from_polylines(polygons: Dict[int, List[str]], tolerance: float) -> Topology:
+    """Topology of already encoded polygons, e.g. values of `polygon_zoom_*` caches.
+
+    Borders are shared where the neighbours kept the same points."""
+    return _build({pk: list(_polyline_rings(lines)) for pk, lines in polygons.items()}, tolerance)
+
+
+def _build(rings: Dict[int, List[QuantizedRing]], tolerance: float) -> Topology:
+    collected: Dict[QuantizedPoint, set] = defaultdict(set)
+    ring_id = 0
+    for region_rings in rings.values():
+        for ring in region_rings:
+            for point in ring:
+                collected[point].add(ring_id)
+            ring_id += 1
+    owners = {point: frozenset(ids) for point, ids in collected.items()}
+
+    builder = TopologyBuilder(tolerance)
+    regions = {pk: [[builder.arc(arc) for arc in _cut(ring, owners)] for ring in region_rings]
+               for pk, region_rings in rings.items()}
+    return Topology(arcs=builder.arcs, regions=regions)
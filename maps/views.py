@@ -1,21 +1,33 @@
-from typing import Type, Dict
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Type
 
 from django.apps import apps
 from django.conf import settings
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render
 from django.views import View
 from django.views.decorators.cache import never_cache
 from django.views.generic.list import BaseListView
 
+from common.compressed import CompressedResponse, cached_payload
 from common.middleware import WSGILanguageRequest
+from .binary import BinaryResponse, CONTENT_TYPE, pack_questions, pack_region
 from .constants import Zoom, GAMES
+from .dedup import parse_known, strip_known
 from .models import Region, Game
+from .questions import cached_questions
+from .streaming import Section, stream_json
 
 
-def region(request, pk: str) -> JsonResponse:
-    obj = get_object_or_404(Region, pk=pk)
-    return JsonResponse(obj.full_info(request.LANGUAGE_CODE))
+def region(request, pk: str) -> HttpResponse:
+    binary = request.GET.get('format') == 'binary'
+
+    def build() -> bytes:
+        info = get_object_or_404(Region, pk=pk).full_info(request.LANGUAGE_CODE)
+        return pack_region(info) if binary else JsonResponse(info).content
+
+    name = 'region_binary' if binary else 'region'
+    payloads = cached_payload(Region.payload_key(name, request.LANGUAGE_CODE, pk), build, settings.PAYLOAD_CACHE_TTL)
+    return CompressedResponse(request, payloads, content_type=CONTENT_TYPE if binary else 'application/json')
 
 
 def index_scroll(request, game: str) -> JsonResponse:
@@ -63,11 +75,33 @@ class GameView(View):
 class QuestionView(View):
     model: Game
 
+    @staticmethod
+    def stream_sections(form, known: Optional[Set[str]]) -> List[Section]:
+        """Sections of the form with polygons from `known` stripped from each question and solved region."""
+        def strip(items: Iterable[Dict]) -> Iterator[Dict]:
+            for item in items:
+                strip_known([item], known)
+                yield item
+
+        return [(name, strip(items) if known is not None and name in ('questions', 'solved') else items)
+                for name, items in form.sections()]
+
     @never_cache  # for HTTP headers
-    def get(self, request: WSGILanguageRequest, name: str, *args, **kwargs) -> JsonResponse:
+    def get(self, request: WSGILanguageRequest, name: str, *args, **kwargs) -> HttpResponse:
         request._cache_update_cache = False  # disable internal cache pylint: disable=protected-access
         obj = get_object_or_404(self.model, slug=name)
         form = self.form(data=request.GET, game=obj)
         if not form.is_valid():
             return JsonResponse(form.errors, status=400)
-        return JsonResponse(form.json())
+        known = parse_known(request.GET.get('known', '')) if 'hashes' in request.GET else None
+        if request.GET.get('stream'):
+            sections = self.stream_sections(form, known)
+            return StreamingHttpResponse(stream_json(sections), content_type='application/json')
+        variant = form.variant()
+        payload = form.json() if variant is None else form.personalize(cached_questions(obj, variant, form.json))
+        if known is not None and 'arcs' not in payload:
+            strip_known(payload['questions'], known)
+            strip_known(payload['solved'], known)
+        if request.GET.get('format') == 'binary':
+            return BinaryResponse(pack_questions(payload))
+        return JsonResponse(payload)
@@ -132,6 +132,28 @@ SESSION_REDIS = {
 }
 
 POLYGON_CACHE_KEY = '{func}_{id}'
+POLYGON_LOCAL_CACHE_SIZE = int(os.environ.get('POLYGON_LOCAL_CACHE_SIZE', 64 * 1024 * 1024))  # bytes
+POLYGON_LOCAL_CACHE_CHECK = 1.0  # seconds between checks of the shared generation
+POLYGON_INVALIDATED_TTL = 60 * 60  # published invalidated keys, processes which are behind more drop everything
+POLYGON_LOCK_TIMEOUT = 60  # the same as uwsgi harakiri
+POLYGON_STALE_TTL = 10 * 60
+POLYGON_ASYNC_POOL_SIZE = 10  # connections of each event loop
+POLYGON_PREPARED_POINTS = int(os.environ.get('POLYGON_PREPARED_POINTS', 2 * 1000 * 1000))  # vertices
+GIVEUP_CHUNK_SIZE = 25  # solves per websocket message
+GAME_SESSION_TTL = 2 * 60 * 60  # seconds to resume a game after a reconnect
+QUESTIONS_CACHE_TTL = 24 * 60 * 60  # assembled question sets, see maps/questions.py
+QUESTIONS_STREAM_CHUNK = 50  # regions read at once by streamed question sets
+PAYLOAD_CACHE_TTL = 24 * 60 * 60  # responses stored with their encodings, see common/compressed.py
+PAYLOAD_MIN_COMPRESS = 1024  # bytes, smaller payloads are stored without encodings
+PAYLOAD_GZIP_LEVEL = 9  # payloads are compressed once, so the best levels are affordable
+PAYLOAD_BROTLI_QUALITY = 11
+WS_QUEUE_SIZE = 8  # frames of one connection waiting to be processed
+WS_QUEUE_POLICY = 'merge'  # what to do with frames over the queue size: 'drop' or 'merge' into queued ones
+WS_IN_FLIGHT = 2  # worker thread tasks of one connection at a time
+WS_MAX_BATCH = 50  # actions in one frame
+WS_MAX_IDS = 500  # ids in one action
+METRICS_SINK = 'common.metrics.LoggingSink'
+METRICS_LOG_INTERVAL = 60  # seconds
 
 ASGI_APPLICATION = "mercator.routing.application"
 CHANNEL_LAYERS = {
@@ -173,6 +195,14 @@ LOGGING = {
             "maxBytes": 10485760,
             'backupCount': 30,
         },
+        "metrics": {
+            "class": "logging.handlers.RotatingFileHandler",
+            'filename': LOG_DIR.joinpath('metrics.log'),
+            "formatter": "verbose",
+            "level": "INFO",
+            "maxBytes": 10485760,
+            'backupCount': 10,
+        },
         'console': {
             'class': 'logging.StreamHandler',
         },
@@ -185,6 +215,15 @@ LOGGING = {
             'level': 'DEBUG',
             'handlers': ['commands'],
         },
+        'metrics': {
+            'level': 'INFO',
+            'handlers': ['metrics'],
+            'propagate': False,
+        },
+        'consumers': {
+            'level': 'ERROR',
+            'handlers': ['file', 'console'],
+        },
         'wambachers': {
             'level': 'DEBUG',
             'handlers': ['commands', 'console'],
@@ -40,7 +40,7 @@ urlpatterns = [
     path('quiz/', include('quiz.urls')),
     path('', include('maps.urls')),
     path('workshop/', include('workshop.urls')),
-    path('puzzle/area/<int:pk>/infobox/', cache_page(DAY)(views.infobox_by_id), name='infobox_by_id'),
+    path('puzzle/area/<int:pk>/infobox/', views.infobox_by_id, name='infobox_by_id'),
 
     path('robots.txt', cache_page(DAY)(TemplateView.as_view(template_name='robots.txt')), name='robots'),
     path('sitemap.xml', cache_page(HOUR)(sitemap), {'sitemaps': sitemaps}, name='sitemap'),
@@ -7,6 +7,8 @@ from django.http import HttpResponse
 from django.shortcuts import render, get_object_or_404
 from redis import StrictRedis
 
+from common.cachable import local_cache
+from common.compressed import CompressedResponse, cached_payload
 from common.middleware import WSGILanguageRequest
 from maps.models import Region
 from puzzle.models import Puzzle
@@ -25,9 +27,13 @@ def index(request: WSGILanguageRequest) -> HttpResponse:
     return render(request, 'index.html', {'games': games, 'gmap_key': google_key})
 
 
-def infobox_by_id(request: WSGILanguageRequest, pk: str) -> JsonResponse:
-    obj = get_object_or_404(Region, pk=pk)
-    return JsonResponse(obj.polygon_infobox[request.LANGUAGE_CODE])
+def infobox_by_id(request: WSGILanguageRequest, pk: str) -> HttpResponse:
+    def build() -> bytes:
+        return JsonResponse(get_object_or_404(Region, pk=pk).polygon_infobox[request.LANGUAGE_CODE]).content
+
+    payloads = cached_payload(Region.payload_key('infobox', request.LANGUAGE_CODE, pk), build,
+                              settings.PAYLOAD_CACHE_TTL)
+    return CompressedResponse(request, payloads)
 
 
 def error(request: WSGIRequest) -> HttpResponse:
@@ -48,4 +54,5 @@ def status(request: WSGIRequest) -> JsonResponse:
             result[service] = 'success'
         except Exception:  # pylint: disable=broad-except
             return JsonResponse({service: 'fail'}, status=503)
+    result['cache'] = local_cache.info()
     return JsonResponse(result)
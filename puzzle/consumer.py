@@ -1,27 +1,101 @@
-from channels.db import database_sync_to_async
+import asyncio
+from typing import Any, List, Dict, Optional
 
-from common.consumer import action
+from django.conf import settings
+
+from common.consumer import INVALID, action
+from common.metrics import section
 from maps.consumer import GameConsumer
-from maps.models import RegionCache
+from maps.models import AsyncRegionCache
+from maps.topology import Topology
 from .forms import RegionContainsForm
+from .models import Puzzle, PuzzleCache
 
 
 class PuzzleConsumer(GameConsumer):
     PREFIX = 'PUZZLE'
     form = RegionContainsForm
 
-    @database_sync_to_async
-    def get_object(self, pk: int) -> RegionCache:
-        return RegionCache(pk)
+    CACHES = ('polygon_bounds', 'polygon_infobox')
+    # solves are sent by GIVEUP_CHUNK_SIZE even in a batch
+    UNBATCHED = ('PUZZLE_GIVEUP',)
+
+    async def check_form(self, form: RegionContainsForm) -> bool:
+        # bounds are loaded with the region, so the form doesn't touch the database
+        return form.is_valid()
 
     @action('PUZZLE_CHECK')
     async def check(self, message: dict, *args, **kwargs):
         await self._check(message['id'], data=message['coords'], zoom=message['zoom'])
 
+    @staticmethod
+    async def get_topology(game: Any) -> Optional[Topology]:
+        """Topology of the puzzle from a message, None if there is no such puzzle."""
+        try:
+            pk = int(game)
+        except (TypeError, ValueError):
+            return None
+        try:
+            return await PuzzleCache(pk).polygon_topology()
+        except Puzzle.DoesNotExist:
+            return None
+
+    async def get_solves(self, pks: List[int], game: Optional[int] = None) -> List[Dict]:
+        """Full info for regions, polygons are references to the topology of the game if it's given.
+
+        Regions outside the game have no arcs, they come with their own polygons."""
+        lang = self.scope['lang']
+        with section('cache'):
+            topology = None if game is None else await self.get_topology(game)
+            if topology is None:
+                return await AsyncRegionCache.async_bulk_full_info(pks, lang, self.zoom)
+            outside = [int(pk) for pk in pks if int(pk) not in topology['regions']]
+            infos = {info['id']: info for info in
+                     await AsyncRegionCache.async_bulk_full_info(outside, lang, self.zoom)}
+            data = await AsyncRegionCache.async_bulk_cache(('polygon_infobox', pk) for pk in pks
+                                                           if int(pk) not in infos)
+        result = []
+        for pk in map(int, pks):
+            if pk in infos:
+                result.append(infos[pk])
+            else:
+                result.append({'infobox': AsyncRegionCache.localized_infobox(data[('polygon_infobox', pk)], lang),
+                               'polygon': topology['regions'][pk], 'id': pk})
+        return result
+
+    async def send_solves(self, solves: List[Dict], game: Optional[int] = None) -> None:
+        size = settings.GIVEUP_CHUNK_SIZE
+        for start in range(0, len(solves), size):
+            chunk = solves[start:start + size]
+            self.strip_known(chunk)
+            message = {'type': 'PUZZLE_GIVEUP_DONE', 'solves': {info['id']: info for info in chunk}}
+            await self.record(message, [info['id'] for info in chunk], grouped=True, game=game)
+            await self.send_json(message)
+
+    def merge_action(self, queued: Dict, content: Dict) -> bool:
+        """Give ups of the same game are merged into one with ids of both."""
+        if str(content.get('type', '')).upper() != 'PUZZLE_GIVEUP' or \
+                not isinstance(queued.get('ids'), list) or not isinstance(content.get('ids'), list) or \
+                {**queued, 'ids': None} != {**content, 'ids': None}:
+            return super().merge_action(queued, content)
+        known = set(queued['ids'])
+        ids = queued['ids'] + [pk for pk in content['ids'] if pk not in known]
+        if len(ids) > settings.WS_MAX_IDS:
+            return False
+        queued['ids'] = ids
+        return True
+
     @action('PUZZLE_GIVEUP')
     async def give_up(self, message: dict, *args, **kwargs):
-        result = {'type': 'PUZZLE_GIVEUP_DONE', 'solves': {}}
-        for pk in message['ids']:
-            region = await self.get_object(pk)
-            result['solves'][pk] = region.full_info(self.scope['lang'])
-        await self.send_json(result)
+        """Sends solves by chunks, the first one is read separately to be shown while the rest is loading."""
+        pks = message.get('ids')
+        game = message.get('game') if message.get('topology') else None
+        if not isinstance(pks, list) or (message.get('topology') and game is None):
+            await self.send_json({'type': INVALID, 'action': message})
+            return
+        size = settings.GIVEUP_CHUNK_SIZE
+        first = asyncio.ensure_future(self.get_solves(pks[:size], game))
+        rest = asyncio.ensure_future(self.get_solves(pks[size:], game)) if len(pks) > size else None
+        await self.send_solves(await first, game)
+        if rest is not None:
+            await self.send_solves(await rest, game)
@@ -1,13 +1,16 @@
-from typing import List
+from typing import Any, List, Dict, Optional, Tuple
 
 from django import forms
 from django.core.exceptions import ValidationError
 from django.forms import Field
 
-from common.constants import GameQuestions
+from common.cachable import CacheItem
+from common.constants import GameQuestions, TopologyGameQuestions
 from common.utils import get_language
 from maps.forms import RegionForm
-from maps.models import RegionInterface
+from maps.constants import hash_cache, zoom_cache
+from maps.models import RegionInterface, Region
+from maps.streaming import Section, chunked
 from .models import Puzzle
 
 
@@ -35,22 +38,95 @@ class RegionContainsForm(forms.Form):
 
 
 class PuzzleForm(RegionForm):
+    topology = forms.BooleanField(required=False)
+
     game: Puzzle
 
-    def json(self) -> GameQuestions:
-        qs = self.regions.filter(id__in=self.game.puzzleregion_set.filter(is_solved=False).
-                                 values_list('region_id', flat=True))
-        questions = [{
+    def variant(self) -> Optional[str]:
+        variant = super().variant()
+        return None if variant is None else f"{variant}_{bool(self.cleaned_data.get('topology'))}"
+
+    def personalize(self, questions: GameQuestions) -> GameQuestions:
+        result = super().personalize(questions)
+        for question in result['questions']:
+            question['default_position'] = self.game.pop_position()
+        return result
+
+    def solved_states(self) -> Dict[int, bool]:
+        return dict(self.game.puzzleregion_set.values_list('region_id', 'is_solved'))
+
+    def topology_json(self) -> TopologyGameQuestions:
+        """The same as `json`, but polygons are lists of rings made of shared arcs.
+
+        `game` is sent back with give-ups to get solves referring to the same arcs."""
+        topology = self.game.polygon_topology
+        unsolved = {pk for pk, is_solved in self.solved_states().items() if not is_solved}
+        regions = [region for region in self.region_list() if region.pk in topology['regions']]
+        data = Region.bulk_cache([('polygon_center' if region.pk in unsolved else 'polygon_infobox', region.pk)
+                                  for region in regions])
+        lang = get_language()
+        questions = []
+        solved = []
+        for region in regions:
+            if region.pk in unsolved:
+                questions.append({
+                    'id': region.pk,
+                    'name': self.name(region),
+                    'polygon': topology['regions'][region.pk],
+                    'center': data[('polygon_center', region.pk)],
+                    'default_position': self.game.pop_position()})
+            else:
+                solved.append({'infobox': Region.localized_infobox(data[('polygon_infobox', region.pk)], lang),
+                               'polygon': topology['regions'][region.pk], 'id': region.pk})
+        return TopologyGameQuestions(questions=questions, solved=solved, game=self.game.pk, arcs=topology['arcs'])
+
+    def build_questions(self, regions: List[Region], data: Dict[CacheItem, Any]) -> List[Dict]:
+        """Questions for unsolved regions, `data` has their polygon for the game zoom, its hash and `polygon_center`."""
+        polygon = zoom_cache(self.game.zoom)
+        if self.cleaned_data.get('map', '') == 'leaflet':
+            return [{'id': region.pk, 'name': self.name(region), 'polygon': region.polygon_leaflet,
+                     'center': data[('polygon_center', region.pk)],  # deprecated for Leaflet
+                     'default_position': self.game.pop_position()} for region in regions]
+        return [{
             'id': region.pk,
-            'name': region.translation.name,
-            'polygon': region.polygon_leaflet
-                       if self.cleaned_data.get('map', '') == 'leaflet' else region.polygon_strip,
-            'center': region.polygon_center,  # deprecated for Leaflet
-            'default_position': self.game.pop_position()} for region in qs]
-        qs = self.regions.filter(id__in=self.game.puzzleregion_set.filter(is_solved=True).
-                                 values_list('region_id', flat=True))
-        solved = [region.full_info(get_language()) for region in qs]
-        return GameQuestions(questions=questions, solved=solved)
+            'name': self.name(region),
+            'polygon': data[(polygon, region.pk)],
+            'hash': data[(hash_cache(polygon), region.pk)],
+            'center': data[('polygon_center', region.pk)],
+            'default_position': self.game.pop_position()} for region in regions]
+
+    def question_items(self, regions: List[Region]) -> List[CacheItem]:
+        polygon = zoom_cache(self.game.zoom)
+        names = (polygon, hash_cache(polygon), 'polygon_center')
+        return [(name, region.pk) for region in regions for name in names]
+
+    def split(self) -> Tuple[List[Region], List[int]]:
+        """Unsolved regions and pks of solved ones in random order."""
+        states = self.solved_states()
+        regions = self.region_list()
+        return ([region for region in regions if states.get(region.pk) is False],
+                [region.pk for region in regions if states.get(region.pk) is True])
+
+    def json(self) -> GameQuestions:
+        """Questions and solved regions, the number of queries doesn't depend on the size of the puzzle."""
+        if self.cleaned_data.get('topology'):
+            return self.topology_json()
+
+        questions, solved = self.split()
+        data = Region.bulk_cache(self.question_items(questions) + Region.full_info_items(solved, self.game.zoom))
+        return GameQuestions(questions=self.build_questions(questions, data),
+                             solved=Region.build_full_info(data, solved, get_language(), self.game.zoom))
+
+    def sections(self) -> List[Section]:
+        if self.cleaned_data.get('topology'):
+            return list(self.topology_json().items())  # arcs are shared by all regions, nothing to split
+
+        questions, solved = self.split()
+        lang = get_language()  # items are produced after the view returns
+        return [('questions', (item for chunk in chunked(questions)
+                               for item in self.build_questions(chunk, Region.bulk_cache(self.question_items(chunk))))),
+                ('solved', (item for chunk in chunked(solved)
+                            for item in Region.bulk_full_info(chunk, lang, self.game.zoom)))]
 
 
 class BoundsField(Field):
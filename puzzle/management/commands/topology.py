@@ -0,0 +1,23 @@
+from django.core.management import BaseCommand
+from tqdm import tqdm
+
+from common.cachable import invalidate
+from mercator.settings.settings import POLYGON_CACHE_KEY
+from puzzle.models import Puzzle
+
+
+class Command(BaseCommand):
+    help = 'Builds shared-border topology of puzzles, so requests find it in the cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', dest='ids', help='Comma-separated puzzle IDs, all puzzles by default')
+
+    def handle(self, **options):
+        query = Puzzle.objects.all()
+        if options['ids']:
+            query = query.filter(pk__in=options['ids'].split(','))
+
+        for puzzle in tqdm(query.iterator(), total=query.count()):
+            # the old topology is served while the new one is built
+            invalidate(POLYGON_CACHE_KEY.format(func='polygon_topology', id=puzzle.pk))
+            puzzle.polygon_topology  # pylint: disable=pointless-statement
@@ -1,12 +1,20 @@
 import random
 from typing import Tuple
 
+from django.conf import settings
 from django.contrib.gis.db.models import MultiPointField
 from django.db import models
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
 from django.utils.translation import ugettext as _
 
+from common.async_cachable import async_cacheable
+from common.cachable import cacheable, invalidate
+from maps.constants import zoom_cache, zoom_tolerance
 from maps.fields import RegionsField
-from maps.models import Game, GameTranslation, Region, Tag
+from maps.models import Game, GameTranslation, Region, RegionTranslation, Tag
+from maps.questions import invalidate_questions
+from maps.topology import Topology, topology_from_polylines
 
 
 class Puzzle(Game):
@@ -34,6 +42,29 @@ class Puzzle(Game):
             random.shuffle(self.__default_positions)
         return self.__default_positions.pop().coords
 
+    @property  # type: ignore
+    @cacheable()
+    def polygon_topology(self) -> Topology:
+        """Built from the stored polygons of the game zoom, it's kept until the puzzle or its regions change.
+
+        `./manage.py topology` builds it ahead of requests."""
+        level = zoom_cache(self.zoom)
+        pks = self.regions.values_list('pk', flat=True)
+        polygons = Region.bulk_cache([(level, pk) for pk in pks])
+        return topology_from_polylines({pk: lines for (_, pk), lines in polygons.items()}, zoom_tolerance(self.zoom))
+
+
+class PuzzleCache:
+    """Caches of the puzzle by its pk for async code."""
+
+    def __init__(self, pk: int):
+        self.pk = int(pk)
+
+    @async_cacheable()
+    def polygon_topology(self) -> Topology:
+        # the same key as Puzzle.polygon_topology, so it is computed without the sync wrapper
+        return Puzzle.polygon_topology.fget.__wrapped__(Puzzle.objects.get(pk=self.pk))
+
 
 class PuzzleRegion(models.Model):
     puzzle = models.ForeignKey(Puzzle, on_delete=models.CASCADE)
@@ -47,3 +78,45 @@ class PuzzleTranslation(GameTranslation):
     class Meta:
         unique_together = ('language_code', 'master')
         db_table = 'puzzle_puzzle_translation'
+
+
+def clear_topology_cache(pk: int) -> None:
+    invalidate(settings.POLYGON_CACHE_KEY.format(func='polygon_topology', id=pk))
+    invalidate_questions(Puzzle.category, [pk])
+
+
+@receiver(post_save, sender=Puzzle, dispatch_uid="clear_puzzle_topology")
+def clear_puzzle_topology(sender, instance: Puzzle, **kwargs):  # pylint: disable=unused-argument
+    clear_topology_cache(instance.pk)
+
+
+@receiver(post_save, sender=PuzzleRegion, dispatch_uid="clear_puzzle_region_topology")
+@receiver(post_delete, sender=PuzzleRegion, dispatch_uid="delete_puzzle_region_topology")
+def clear_puzzle_region_topology(sender, instance: PuzzleRegion, **kwargs):  # pylint: disable=unused-argument
+    clear_topology_cache(instance.puzzle_id)
+
+
+@receiver(post_save, sender=Region, dispatch_uid="clear_region_topology")
+def clear_region_topology(sender, instance: Region, **kwargs):  # pylint: disable=unused-argument
+    for pk in PuzzleRegion.objects.filter(region=instance).values_list('puzzle_id', flat=True).distinct():
+        clear_topology_cache(pk)
+
+
+@receiver(pre_delete, sender=Region, dispatch_uid="collect_deleted_region_puzzles")
+def collect_region_puzzles(sender, instance: Region, **kwargs):  # pylint: disable=unused-argument
+    # the puzzle regions are gone after the delete, the caches are cleared once it happened
+    instance.deleted_puzzles = list(PuzzleRegion.objects.filter(region=instance).
+                                    values_list('puzzle_id', flat=True).distinct())
+
+
+@receiver(post_delete, sender=Region, dispatch_uid="delete_region_topology")
+def delete_region_topology(sender, instance: Region, **kwargs):  # pylint: disable=unused-argument
+    for pk in getattr(instance, 'deleted_puzzles', []):
+        clear_topology_cache(pk)
+
+
+@receiver(post_save, sender=RegionTranslation, dispatch_uid="clear_region_translation_puzzle_questions")
+@receiver(post_delete, sender=RegionTranslation, dispatch_uid="delete_region_translation_puzzle_questions")
+def clear_translation_questions(sender, instance: RegionTranslation, **kwargs):  # pylint: disable=unused-argument
+    invalidate_questions(Puzzle.category, PuzzleRegion.objects.filter(region_id=instance.master_id).
+                         values_list('puzzle_id', flat=True).distinct())
@@ -1,10 +1,17 @@
+import json
 from typing import List
 
-from django.test import TestCase
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from common.tests import TestGameMixin
+from maps.constants import Zoom, hash_cache, zoom_cache
+from maps.models.region import EMPTY_NAME
+from .consumer import PuzzleConsumer
 from .factories import PuzzleFactory, PuzzleRegionFactory
+from .forms import PuzzleForm
 from .models import Puzzle, PuzzleRegion
 
 
@@ -42,3 +49,81 @@ class PuzzleTestCase(TestGameMixin, TestCase):
         response = self.client.get(f"{url}?id={self.questions[0].region_id}")
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.json()['questions']), 1)
+
+    def test_questions_queries(self):
+        def count_queries() -> int:
+            form = PuzzleForm(game=self.puzzle, data={})
+            self.assertTrue(form.is_valid())
+            form.json()  # fills caches of new regions
+            with CaptureQueriesContext(connection) as context:
+                form.json()
+            return len(context.captured_queries)
+
+        small = count_queries()
+        for _ in range(5):
+            PuzzleRegionFactory(puzzle=self.puzzle)
+            PuzzleRegionFactory(puzzle=self.puzzle, is_solved=True)
+        self.assertEqual(count_queries(), small)
+
+    def test_cached_questions(self):
+        url = reverse('puzzle_questions', kwargs={'name': self.puzzle.slug})
+        with CaptureQueriesContext(connection) as built:
+            self.client.get(url)
+        with CaptureQueriesContext(connection) as cached:
+            data = self.client.get(url).json()
+        self.assertLess(len(cached.captured_queries), len(built.captured_queries))
+        self.assertEqual(len(data['questions']), self.QUESTIONS_COUNT)
+
+        question = self.questions[0]
+        question.region.translations.filter(language_code='en').update(name='renamed')
+        question.region.translations.get(language_code='en').save()
+        names = {item['id']: item['name'] for item in self.client.get(url).json()['questions']}
+        self.assertEqual(names[question.region_id], 'renamed')
+
+        question.region.translations.filter(language_code='en').delete()
+        names = {item['id']: item['name'] for item in self.client.get(url).json()['questions']}
+        self.assertEqual(names[question.region_id], EMPTY_NAME)
+
+        question.region.delete()
+        self.assertNotIn(question.region_id, self._get_ids(self.client.get(url).json()['questions']))
+
+    def test_streamed_questions(self):
+        url = reverse('puzzle_questions', kwargs={'name': self.puzzle.slug})
+        response = self.client.get(f'{url}?stream=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(data['solved']), self.SOLVED_COUNT)
+        self.assertSetEqual(set(self._get_ids(data['questions'])), set(x.region.pk for x in self.questions))
+
+    def test_topology_questions(self):
+        url = reverse('puzzle_questions', kwargs={'name': self.puzzle.slug})
+        response = self.client.get(f"{url}?topology=1")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['game'], self.puzzle.pk)
+        self.assertEqual(len(data['questions']), self.QUESTIONS_COUNT)
+        self.assertEqual(len(data['solved']), self.SOLVED_COUNT)
+        for question in data['questions']:
+            for ring in question['polygon']:
+                for index in ring:
+                    self.assertLess(index if index >= 0 else ~index, len(data['arcs']))
+
+
+class PuzzleConsumerTestCase(SimpleTestCase):
+    def test_merge_give_ups(self):
+        consumer = PuzzleConsumer()
+        queued = {'type': 'PUZZLE_GIVEUP', 'ids': [1, 2]}
+        self.assertTrue(consumer.merge_action(queued, {'type': 'PUZZLE_GIVEUP', 'ids': [2, 3]}))
+        self.assertListEqual(queued['ids'], [1, 2, 3])
+        self.assertFalse(consumer.merge_action(queued, {'ids': [4]}))  # frames without type aren't merged
+        self.assertFalse(consumer.merge_action(queued, {'type': 'PUZZLE_GIVEUP'}))
+
+    def test_zoom_caches(self):
+        consumer = PuzzleConsumer()
+        self.assertIn('polygon_gmap', consumer.caches())
+        consumer.zoom = consumer.parse_zoom('6')
+        self.assertIn(zoom_cache(Zoom.COUNTRY), consumer.caches())
+        self.assertIn(hash_cache(zoom_cache(Zoom.COUNTRY)), consumer.caches())
+        self.assertIsNone(consumer.parse_zoom(42))
+        self.assertIsNone(consumer.parse_zoom(None))
@@ -1,8 +1,6 @@
-from channels.db import database_sync_to_async
-
 from common.consumer import action
 from maps.consumer import GameConsumer
-from maps.models import RegionCache
+from maps.prepared import prepared_regions
 from .forms import PointContainsForm
 
 
@@ -10,9 +8,11 @@ class QuizConsumer(GameConsumer):
     PREFIX = 'QUIZ'
     form = PointContainsForm
 
-    @database_sync_to_async
-    def get_object(self, pk: int) -> RegionCache:
-        return RegionCache(pk)
+    async def check_form(self, form: PointContainsForm) -> bool:
+        form.prepared = prepared_regions.get(form.area.pk)
+        if form.prepared is not None:
+            return form.is_valid()  # answered in memory, no database
+        return await super().check_form(form)
 
     @action('QUIZ_CHECK')
     async def check(self, message: dict, *args, **kwargs):
@@ -1,11 +1,16 @@
-from typing import List
+import random
+from typing import Dict, List, Optional, Tuple
 
 from django import forms
+from django.contrib.gis.geos import GEOSGeometry, Point
 from django.db import connection
 
 from common.constants import GameQuestions
 from common.utils import get_language
 from maps.forms import RegionForm
+from maps.models import Region, RegionTranslation
+from maps.prepared import SharedPrepared, prepared_regions
+from maps.streaming import Section, chunked
 from .models import Quiz
 
 
@@ -13,21 +18,28 @@ class PointContainsForm(forms.Form):
     lat = forms.FloatField()
     lng = forms.FloatField()
 
-    CONTAINS_SQL = """SELECT ST_Covers(polygon, p)
-FROM (SELECT polygon from maps_region where id = {id}) As polygon, 
-    ST_Point({lon}, {lat}) as p;"""
+    # the polygon comes with the answer to be prepared for the next checks
+    CONTAINS_SQL = """SELECT ST_Covers(polygon, ST_Point(%(lon)s, %(lat)s)), ST_AsBinary(polygon)
+FROM maps_region WHERE id = %(id)s;"""
 
     def __init__(self, area, *args, **kwargs):
         self.area = area
+        self.prepared: Optional[SharedPrepared] = None
         super().__init__(*args, **kwargs)
 
     def clean(self):
         cleaned_data = super().clean()
-        with connection.cursor() as cursor:
-            params = {'id': self.area.pk, 'lat': cleaned_data.get('lat'), 'lon': cleaned_data.get('lng')}
-            cursor.execute(self.CONTAINS_SQL.format(**params))  # lgtm [py/sql-injection]
-            row = cursor.fetchone()
-            result = row[0]
+        if 'lat' not in cleaned_data or 'lng' not in cleaned_data:
+            return cleaned_data
+        prepared = self.prepared or prepared_regions.get(self.area.pk)
+        if prepared is not None:
+            result = prepared.covers(Point(cleaned_data['lng'], cleaned_data['lat'], srid=4326))
+        else:
+            with connection.cursor() as cursor:
+                params = {'id': self.area.pk, 'lat': cleaned_data['lat'], 'lon': cleaned_data['lng']}
+                cursor.execute(self.CONTAINS_SQL, params)
+                result, wkb = cursor.fetchone()
+            prepared_regions.add(self.area.pk, GEOSGeometry(bytes(wkb), srid=4326))
         if not result:
             raise forms.ValidationError('Point not in polygons')
 
@@ -40,35 +52,61 @@ class QuizInfoboxForm(RegionForm):
     def clean_params(self) -> List[str]:
         return self.cleaned_data['params'].split(',')
 
-    def json(self) -> GameQuestions:
+    def variant(self) -> Optional[str]:
+        variant = super().variant()
+        return None if variant is None else f"{variant}_{','.join(self.cleaned_data['params'])}"
+
+    def infoboxes(self) -> Dict[int, Optional[Dict]]:
+        """Infoboxes in the current language by region in random order, None for missing translations.
+
+        Two queries for any quiz and nothing is created, unlike `Region.translation`.
+        """
+        pks = list(self.regions.order_by().values_list('pk', flat=True))
+        random.shuffle(pks)
+        found = dict(RegionTranslation.objects.filter(master_id__in=pks, language_code=get_language()).
+                     values_list('master_id', 'infobox'))
+        return {pk: found.get(pk) for pk in pks}
+
+    def split(self) -> Tuple[List[Dict], List[int]]:
+        """Questions and pks of solved regions, regions without values of params are solved."""
         def extract_capital(capital) -> str:
             return capital['name'] if isinstance(capital, dict) else capital
 
-        should_be_solved = [x.region_id for x in self.game.quizregion_set.all() if x.is_solved]
+        should_be_solved = set(self.game.quizregion_set.filter(is_solved=True).values_list('region_id', flat=True))
         questions = []
         solved = []
-        for region in self.regions:
-            trans = region.translation
-            if trans.infobox is None or region.pk in should_be_solved:
-                solved.append(region.full_info(get_language()))
+        for pk, infobox in self.infoboxes().items():
+            if infobox is None or pk in should_be_solved:
+                solved.append(pk)
                 continue
             k = {}
             for param in self.cleaned_data['params']:
                 if param == 'capital':
-                    capital = trans.infobox.get('capital', None)
-                    value = trans.infobox.get('name', None) if capital is None else extract_capital(capital)
+                    capital = infobox.get('capital', None)
+                    value = infobox.get('name', None) if capital is None else extract_capital(capital)
                 elif param == 'name':
-                    value = trans.infobox.get('name', None)
+                    value = infobox.get('name', None)
                 else:
-                    value = trans.infobox.get(param, None)
+                    value = infobox.get(param, None)
                 if value is not None:
                     k[param] = value
 
             # if question has not values - set them as founded
             if k != {}:
-                k['id'] = region.pk
-                k['name'] = trans.infobox.get('name', None)
+                k['id'] = pk
+                k['name'] = infobox.get('name', None)
                 questions.append(k)
             else:
-                solved.append(region.full_info(get_language()))
-        return GameQuestions(questions=questions, solved=solved)
+                solved.append(pk)
+        return questions, solved
+
+    def json(self) -> GameQuestions:
+        questions, solved = self.split()
+        return GameQuestions(questions=questions, solved=Region.bulk_full_info(solved, get_language(), self.game.zoom))
+
+    def sections(self) -> List[Section]:
+        questions, solved = self.split()
+        lang = get_language()  # items are produced after the view returns
+        return [('questions', questions),
+                ('solved', (item for chunk in chunked(solved)
+                            for item in Region.bulk_full_info(chunk, lang, self.game.zoom)))]
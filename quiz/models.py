@@ -2,9 +2,12 @@ from typing import List
 
 from django.contrib.postgres.fields import ArrayField
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils.translation import ugettext as _
 
-from maps.models import Game, GameTranslation, Region
+from maps.models import Game, GameTranslation, Region, RegionTranslation
+from maps.questions import invalidate_questions
 
 QUIZ_OPTIONS = (
     ('name', 'name'),
@@ -45,3 +48,27 @@ class QuizTranslation(GameTranslation):
     class Meta:
         unique_together = ('language_code', 'master')
         db_table = 'quiz_quiz_translation'
+
+
+@receiver(post_save, sender=Quiz, dispatch_uid="clear_quiz_questions")
+def clear_quiz_questions(sender, instance: Quiz, **kwargs):  # pylint: disable=unused-argument
+    invalidate_questions(Quiz.category, [instance.pk])
+
+
+@receiver(post_save, sender=QuizRegion, dispatch_uid="clear_quiz_region_questions")
+@receiver(post_delete, sender=QuizRegion, dispatch_uid="delete_quiz_region_questions")
+def clear_quiz_region_questions(sender, instance: QuizRegion, **kwargs):  # pylint: disable=unused-argument
+    invalidate_questions(Quiz.category, [instance.quiz_id])
+
+
+@receiver(post_save, sender=Region, dispatch_uid="clear_region_quiz_questions")
+def clear_region_questions(sender, instance: Region, **kwargs):  # pylint: disable=unused-argument
+    invalidate_questions(Quiz.category, QuizRegion.objects.filter(region=instance).
+                         values_list('quiz_id', flat=True).distinct())
+
+
+@receiver(post_save, sender=RegionTranslation, dispatch_uid="clear_region_translation_quiz_questions")
+@receiver(post_delete, sender=RegionTranslation, dispatch_uid="delete_region_translation_quiz_questions")
+def clear_translation_questions(sender, instance: RegionTranslation, **kwargs):  # pylint: disable=unused-argument
+    invalidate_questions(Quiz.category, QuizRegion.objects.filter(region_id=instance.master_id).
+                         values_list('quiz_id', flat=True).distinct())
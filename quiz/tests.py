@@ -1,10 +1,15 @@
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 
+from django.contrib.gis.geos import Point
 from django.test import TestCase
 from django.urls import reverse
 
 from common.tests import TestGameMixin
+from maps.models import RegionTranslation
+from maps.prepared import prepared_regions
 from .factories import QuizFactory, QuizRegionFactory
+from .forms import PointContainsForm, QuizInfoboxForm
 from .models import QuizRegion, Quiz
 
 
@@ -44,3 +49,27 @@ class QuizTestCase(TestGameMixin, TestCase):
         response = self.client.get(f"{self._question_url}&id={self.questions[0].region_id}")
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.json()['questions']), 1)
+
+    def test_questions_without_translation(self):
+        question = QuizRegionFactory(quiz=self.quiz)
+        question.region.translations.filter(language_code='en').delete()
+        form = QuizInfoboxForm(game=self.quiz, data={'params': 'name'})
+        self.assertTrue(form.is_valid())
+        data = form.json()
+        self.assertNotIn(question.region_id, self._get_ids(data['questions']))
+        self.assertIn(question.region_id, [item['id'] for item in data['solved']])
+        self.assertFalse(RegionTranslation.objects.filter(master=question.region, language_code='en').exists())
+
+    def test_point_contains(self):
+        region = self.questions[0].region
+        prepared_regions.discard(region.pk)
+        inside = {'lat': 49.4590, 'lng': -2.4620}
+        with self.assertNumQueries(1):
+            self.assertTrue(PointContainsForm(region, data=inside).is_valid())
+        with self.assertNumQueries(0):  # prepared polygon is used
+            self.assertTrue(PointContainsForm(region, data=inside).is_valid())
+            self.assertFalse(PointContainsForm(region, data={'lat': 0.0, 'lng': 0.0}).is_valid())
+        prepared = prepared_regions.get(region.pk)
+        point = Point(inside['lng'], inside['lat'], srid=4326)
+        with ThreadPoolExecutor(max_workers=4) as executor:  # shared by the threads of consumers
+            self.assertTrue(all(executor.map(lambda _: prepared.covers(point), range(100))))